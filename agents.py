@@ -13,6 +13,8 @@ class Agent(BaseSprite):
         self.last_action = None
         self.id = None
         self.active = True
+        # util.Deadline of the current move, set by the game before get_next_action is called
+        self.deadline = None
 
     def get_id(self):
         return self.id
@@ -25,7 +27,8 @@ class Agent(BaseSprite):
 
     def copy(self):
         agent_copy = copy.copy(self)
-        agent_copy.rect = self.image.get_rect()
+        if self.image is not None:
+            agent_copy.rect = self.image.get_rect()
         agent_copy.place_to(self.position())
         return agent_copy
 
@@ -46,7 +49,8 @@ class Agent(BaseSprite):
 
     def apply_action(self, action):
         self.last_action = action
-        self.place_to(tuple(map(sum, zip(self.position(), Action.actions[action]))))
+        d_row, d_col = Action.actions[action]
+        self.place_to((self.row + d_row, self.col + d_col))
 
     @staticmethod
     def legal_fields():
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+import config
+
+from bitboard import BitboardState
+from evaluators import EVALUATORS
+from minimax import Minimax, MinimaxAB, Expectimax, StarExpectimax, MinimaxN, Paranoid, BestReplySearch, MaxN
+from ordering import MoveOrdering
+from states import AgentState, GameState, HOLE, ROAD, load_map
+from stats import SearchStats
+from transposition import TranspositionTable
+
+# name -> factory of a fresh search algorithm
+ALGORITHMS = {
+    'Minimax': Minimax,
+    'MinimaxAB': MinimaxAB,
+    'MinimaxAB+TT': lambda: MinimaxAB(TranspositionTable(), MoveOrdering()),
+    'MinimaxPVS': lambda: MinimaxAB(TranspositionTable(), MoveOrdering(), True, config.ASPIRATION_WINDOW),
+    'Expectimax': Expectimax,
+    'Star1': lambda: StarExpectimax(1),
+    'Star2': lambda: StarExpectimax(2),
+    'MinimaxN': MinimaxN,
+    'Paranoid': lambda: Paranoid(TranspositionTable(), MoveOrdering()),
+    'BRS': lambda: BestReplySearch(TranspositionTable(), MoveOrdering()),
+    'MaxN': MaxN,
+}
+STATES = {'bitboard': BitboardState.from_game_state, 'game': lambda state: state}
+# rows, cols, hole share, bots
+GENERATED_BOARDS = [(10, 10, 0.2, 1), (12, 12, 0.2, 3)]
+BOT_KINDS = '1234'
+
+
+def load_state(char_map):
+    # agent ids as in game.Game: the student agent is 0, bots are numbered in map order
+    student, bots = None, []
+    for i, row in enumerate(char_map):
+        for j, el in enumerate(row):
+            if el == '0':
+                student = (i, j)
+            elif el in BOT_KINDS:
+                bots.append((el, (i, j)))
+    if student is None:
+        raise Exception(f'ERR: StudentAgent NOT defined!')
+    agents = [AgentState(0, '0', student)] + [AgentState(i, kind, pos) for i, (kind, pos) in enumerate(bots, 1)]
+    return GameState(char_map, agents, None)
+
+
+def generate_board(rows, cols, hole_share, bots, seed=0):
+    rnd = random.Random(seed)
+    cells = [(i, j) for i in range(rows) for j in range(cols)]
+    char_map = [[HOLE if rnd.random() < hole_share else ROAD for _ in range(cols)] for _ in range(rows)]
+    for k, (i, j) in enumerate(rnd.sample(cells, bots + 1)):
+        char_map[i][j] = '0' if not k else BOT_KINDS[(k - 1) % len(BOT_KINDS)]
+    return char_map
+
+
+def positions(maps, generated, seed):
+    boards = [(os.path.basename(map_path), load_map(map_path)) for map_path in maps]
+    boards += [(f'gen{rows}x{cols}h{hole_share}b{bots}s{seed}', generate_board(rows, cols, hole_share, bots, seed))
+               for rows, cols, hole_share, bots in generated]
+    return boards
+
+
+def effective_branching_factor(nodes, depth):
+    # b such that 1 + b + b^2 + ... + b^depth = nodes
+    if depth <= 0 or nodes <= 1:
+        return 0.0
+    low, high = 0.0, float(nodes)
+    for _ in range(100):
+        b = (low + high) / 2
+        total = sum(b ** i for i in range(depth + 1))
+        if total < nodes:
+            low = b
+        else:
+            high = b
+    return (low + high) / 2
+
+
+def run_search(algorithm, state, depth, in_place, evaluator='mobility'):
+    alg = ALGORITHMS[algorithm]()
+    alg.evaluator = EVALUATORS[evaluator]
+    stats = SearchStats()
+    stats.attach(alg)
+    alg.start_search()
+    start_time = time.perf_counter()
+    if in_place:
+        score, action = alg.search_in_place(state, depth, 0)
+    else:
+        score, action = alg.search(state, depth, 0)
+    return alg, stats, time.perf_counter() - start_time, score, action
+
+
+def benchmark(board_name, char_map, algorithm, depth, state_kind, in_place, repeat=1, memory=True,
+              evaluator='mobility'):
+    state = STATES[state_kind](load_state(char_map))
+    times = []
+    for _ in range(repeat):
+        alg, stats, elapsed, score, action = run_search(algorithm, state, depth, in_place, evaluator)
+        times.append(elapsed)
+    wall_time = min(times)
+    peak_memory = None
+    if memory:
+        # a separate run, tracing allocations slows the search down several times
+        tracemalloc.start()
+        run_search(algorithm, state, depth, in_place, evaluator)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        'board': board_name,
+        'algorithm': algorithm,
+        'evaluator': evaluator,
+        'depth': depth,
+        'state': state_kind,
+        'in_place': in_place,
+        'score': score,
+        'action': action,
+        'wall_time': wall_time,
+        'nodes': alg.nodes,
+        'leaf_evals': stats.evals,
+        'cutoffs': alg.cutoffs,
+        'cutoffs_by_index': stats.to_dict()['cutoffs_by_index'],
+        'nodes_per_ply': stats.to_dict()['nodes_per_ply'],
+        'nodes_per_sec': alg.nodes / wall_time if wall_time else 0.0,
+        'ebf': effective_branching_factor(alg.nodes, depth),
+        'peak_memory': peak_memory,
+    }
+
+
+def format_row(row):
+    memory = f'{row["peak_memory"] / 1024:>10.0f}' if row['peak_memory'] is not None else f'{"-":>10}'
+    return (f'{row["board"]:<22}{row["algorithm"]:<14}{row.get("evaluator", "mobility"):<10}{row["depth"]:>3} '
+            f'{row["state"]:<9}{"inplace" if row["in_place"] else "copy":<8}{row["wall_time"]:>9.3f}{row["nodes"]:>10}'
+            f'{row["leaf_evals"]:>10}{row["cutoffs"]:>9}{row["nodes_per_sec"]:>10.0f}{row["ebf"]:>7.2f}{memory}')
+
+
+def header():
+    return (f'{"board":<22}{"algorithm":<14}{"evaluator":<10}{"d":>3} {"state":<9}{"mode":<8}{"time [s]":>9}'
+            f'{"nodes":>10}{"evals":>10}{"cutoffs":>9}{"nodes/s":>10}{"ebf":>7}{"mem [KB]":>10}')
+
+
+def case_key(row):
+    return row['board'], row['algorithm'], row.get('evaluator', 'mobility'), row['depth'], row['state'], row['in_place']
+
+
+def compare(rows, baseline_path, threshold):
+    # prints the cases that got slower than the baseline run by more than threshold (e.g. 0.1 - 10%)
+    with open(baseline_path, 'r') as f:
+        baseline = {case_key(row): row for row in json.load(f)['results']}
+    regressions = 0
+    for row in rows:
+        old = baseline.get(case_key(row))
+        if old is None:
+            continue
+        ratio = row['wall_time'] / old['wall_time'] if old['wall_time'] else 1.0
+        if ratio > 1 + threshold or row['nodes'] != old['nodes']:
+            regressions += 1
+            print(f'WARN: {row["board"]} {row["algorithm"]} {row["evaluator"]} d{row["depth"]} {row["state"]} '
+                  f'{"inplace" if row["in_place"] else "copy"}: time x{ratio:.2f}, '
+                  f'nodes {old["nodes"]} -> {row["nodes"]}')
+    return regressions
+
+
+def main():
+    maps = sorted(os.path.join(config.MAP_FOLDER, name) for name in os.listdir(config.MAP_FOLDER)
+                  if name.endswith('.txt'))
+    parser = argparse.ArgumentParser(description='Fixed depth search benchmarks on the maps and generated boards.')
+    parser.add_argument('--maps', nargs='+', default=maps)
+    parser.add_argument('--no-generated', action='store_true', help='skip the generated larger boards')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated boards')
+    parser.add_argument('--algorithms', nargs='+', default=list(ALGORITHMS.keys()), choices=list(ALGORITHMS.keys()))
+    parser.add_argument('--evaluators', nargs='+', default=['mobility'], choices=list(EVALUATORS.keys()))
+    parser.add_argument('--depths', nargs='+', type=int, default=[4, 6])
+    parser.add_argument('--states', nargs='+', default=['bitboard'], choices=list(STATES.keys()))
+    parser.add_argument('--modes', nargs='+', default=['copy', 'inplace'], choices=['copy', 'inplace'])
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the fastest one is reported')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    parser.add_argument('--output', default=os.path.join(config.RESULTS_FOLDER, 'benchmark.json'))
+    parser.add_argument('--baseline', default=None, help='earlier --output file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    boards = positions(args.maps, [] if args.no_generated else GENERATED_BOARDS, args.seed)
+    rows = []
+    print(header())
+    for board_name, char_map in boards:
+        for algorithm in args.algorithms:
+            for evaluator in args.evaluators:
+                for depth in args.depths:
+                    for state_kind in args.states:
+                        for mode in args.modes:
+                            row = benchmark(board_name, char_map, algorithm, depth, state_kind, mode == 'inplace',
+                                            args.repeat, not args.no_memory, evaluator)
+                            rows.append(row)
+                            print(format_row(row))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': rows,
+        }, f, indent=2)
+    if args.baseline is not None and compare(rows, args.baseline, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+from actions import Action
+from geometry import BoardGeometry
+from states import HOLE, ROAD
+from zobrist import ZobristKeys
+
+
+def to_bitboard(state):
+    return state if isinstance(state, BitboardState) else BitboardState.from_game_state(state)
+
+
+class BitboardAgent:
+    # Read-mostly view of one agent inside a BitboardState, mirrors the Agent API used by the searches.
+    __slots__ = ('state', 'id')
+
+    def __init__(self, state, agent_id):
+        self.state = state
+        self.id = agent_id
+
+    def get_id(self):
+        return self.id
+
+    def is_active(self):
+        return self.state.active[self.id]
+
+    def set_active(self, active):
+        self.state.set_agent_active(self.id, active)
+
+    def position(self):
+        return self.state.geometry.position(self.state.positions[self.id])
+
+    def kind(self):
+        return self.state.kinds[self.id]
+
+    def get_last_action(self):
+        return self.state.last_actions[self.id]
+
+    def get_legal_actions(self, state):
+        return state.get_legal_actions(self.id)
+
+    @staticmethod
+    def legal_fields():
+        return {ROAD}
+
+
+class BitboardState:
+    # Compact alternative to GameState: every cell an agent can not step on (holes, other non-road cells and
+    # agents) lives in one int bitmask, agents are packed into tuples of cell indices / active flags,
+    # so copying a state is O(agents).
+    __slots__ = ('geometry', 'blocked', 'positions', 'active', 'kinds', 'last_actions',
+                 'last_agent_played_id', 'win', 'loss', '_agents', 'undo_stack', 'hash_key', 'symmetric_keys')
+
+    def __init__(self, geometry, holes, positions, active, kinds, last_actions, last_agent_played_id):
+        self.geometry = geometry
+        self.blocked = holes
+        for idx in positions:
+            self.blocked |= 1 << idx
+        self.positions = positions
+        self.active = active
+        self.kinds = kinds
+        self.last_actions = last_actions
+        self.last_agent_played_id = last_agent_played_id
+        self.win = False
+        self.loss = False
+        self._agents = None
+        self.undo_stack = None
+        # incremental Zobrist hash, computed lazily by zobrist_hash
+        self.hash_key = None
+        # incremental hashes of the mirrored / rotated states, computed lazily by symmetric_hashes
+        self.symmetric_keys = None
+
+    @staticmethod
+    def from_game_state(state):
+        char_map = state.char_map
+        geometry = BoardGeometry.get(len(char_map), len(char_map[0]))
+        positions = tuple(geometry.index(agent.position()) for agent in state.agents)
+        occupied = set(positions)
+        holes = 0
+        for row_idx, row in enumerate(char_map):
+            for col_idx, char in enumerate(row):
+                idx = row_idx * geometry.cols + col_idx
+                if char != ROAD and idx not in occupied:
+                    holes |= 1 << idx
+        return BitboardState(geometry, holes, positions,
+                             tuple(agent.is_active() for agent in state.agents),
+                             tuple(agent.kind() for agent in state.agents),
+                             tuple(agent.get_last_action() for agent in state.agents),
+                             state.last_agent_played_id)
+
+    @property
+    def agents(self):
+        if self._agents is None:
+            self._agents = [BitboardAgent(self, agent_id) for agent_id in range(len(self.positions))]
+        return self._agents
+
+    @property
+    def occupied(self):
+        occupied = 0
+        for idx in self.positions:
+            occupied |= 1 << idx
+        return occupied
+
+    @property
+    def holes(self):
+        return self.blocked & ~self.occupied
+
+    @property
+    def char_map(self):
+        geometry = self.geometry
+        char_map = [[HOLE if self.holes >> (row * geometry.cols + col) & 1 else ROAD
+                     for col in range(geometry.cols)] for row in range(geometry.rows)]
+        for agent_id, idx in enumerate(self.positions):
+            row, col = geometry.position(idx)
+            char_map[row][col] = self.kinds[agent_id]
+        return char_map
+
+    def __str__(self):
+        return '\n'.join([''.join(row) for row in self.char_map])
+
+    def adjust_win_loss(self):
+        actions_len = [len(self.get_legal_actions(agent_id)) for agent_id in range(len(self.positions))]
+        if not any(actions_len[1:]) and actions_len[0]:
+            self.win = True
+        elif not actions_len[0] and any(actions_len[1:]):
+            self.loss = True
+        elif not any(actions_len):
+            self.loss = True if self.last_agent_played_id is not None and self.last_agent_played_id != 0 else False
+            self.win = True if self.last_agent_played_id is not None and self.last_agent_played_id == 0 else False
+
+    def copy(self):
+        state = BitboardState(self.geometry, self.blocked, self.positions, self.active, self.kinds,
+                              self.last_actions, self.last_agent_played_id)
+        state.hash_key = self.hash_key
+        state.symmetric_keys = self.symmetric_keys
+        return state
+
+    def zobrist_keys(self):
+        return ZobristKeys.get(self.geometry.size, len(self.positions))
+
+    def hole_indices(self):
+        holes = self.holes
+        return [idx for idx in range(self.geometry.size) if holes >> idx & 1]
+
+    def zobrist_hash(self):
+        if self.hash_key is None:
+            self.hash_key = self.zobrist_keys().hash(self.hole_indices(), self.positions, self.active,
+                                                     self.last_agent_played_id)
+        return self.hash_key
+
+    def symmetric_hashes(self):
+        if self.symmetric_keys is None:
+            self.symmetric_keys = self.zobrist_keys().symmetric_hashes(self.geometry.symmetries, self.hole_indices(),
+                                                                       self.positions, self.active,
+                                                                       self.last_agent_played_id)
+        return self.symmetric_keys
+
+    def canonical_hash(self):
+        # (smallest hash of the symmetric states, index of its geometry.symmetries transform), the same key
+        # for every mirror image / rotation of the state
+        keys = self.symmetric_hashes()
+        symmetry = min(range(len(keys)), key=keys.__getitem__)
+        return keys[symmetry], symmetry
+
+    def set_agent_active(self, agent_id, active):
+        if self.active[agent_id] != active and self.hash_key is not None:
+            self.hash_key ^= self.zobrist_keys().inactive[agent_id]
+        if self.active[agent_id] != active and self.symmetric_keys is not None:
+            inactive = self.zobrist_keys().inactive[agent_id]
+            self.symmetric_keys = tuple(h ^ inactive for h in self.symmetric_keys)
+        self.active = self.active[:agent_id] + (active,) + self.active[agent_id + 1:]
+
+    def is_win(self):
+        return self.win
+
+    def is_loss(self):
+        return self.loss
+
+    def free_mask(self):
+        return self.geometry.full_mask & ~self.blocked
+
+    def is_position_legal(self, position, agent):
+        row, col = position
+        geometry = self.geometry
+        if not (0 <= row < geometry.rows and 0 <= col < geometry.cols):
+            return False
+        return not self.blocked >> (row * geometry.cols + col) & 1 or position == agent.position()
+
+    def get_legal_actions(self, agent_id):
+        if not self.active[agent_id]:
+            return []
+        idx = self.positions[agent_id]
+        free = self.geometry.neighbour_masks[idx] & ~self.blocked
+        cache = self.geometry.legal_actions[idx]
+        actions = cache.get(free)
+        if actions is None:
+            actions = [act_name for act_name, bit, _ in self.geometry.neighbours[idx] if free & bit]
+            cache[free] = actions
+        return list(actions)
+
+    def get_new_index(self, agent_id, action):
+        if action not in Action.actions.keys():
+            raise Exception(f'ERR: {action} is not a legal action names! '
+                            f'Legal names are ({", ".join(n for n in Action.actions.keys())})')
+        old_idx = self.positions[agent_id]
+        new_idx = self.geometry.moves[old_idx].get(action)
+        if new_idx is None or self.blocked >> new_idx & 1:
+            raise Exception(f'ERR: {action} is not legal! '
+                            f'Agent position: {self.geometry.position(old_idx)}')
+        return new_idx
+
+    def apply_action(self, agent_id, action):
+        new_idx = self.get_new_index(agent_id, action)
+        old_idx = self.positions[agent_id]
+        positions = self.positions[:agent_id] + (new_idx,) + self.positions[agent_id + 1:]
+        last_actions = self.last_actions[:agent_id] + (action,) + self.last_actions[agent_id + 1:]
+        state = BitboardState.__new__(BitboardState)
+        state.geometry = self.geometry
+        # the vacated cell becomes a hole, so it stays blocked
+        state.blocked = self.blocked | (1 << new_idx)
+        state.positions = positions
+        state.active = self.active
+        state.kinds = self.kinds
+        state.last_actions = last_actions
+        state.last_agent_played_id = agent_id
+        state.win = False
+        state.loss = False
+        state._agents = None
+        state.undo_stack = None
+        state.hash_key = None if self.hash_key is None else \
+            self.hash_key ^ self.zobrist_keys().move_delta(agent_id, old_idx, new_idx, self.last_agent_played_id)
+        state.symmetric_keys = None if self.symmetric_keys is None else self.zobrist_keys().symmetric_move_delta(
+            self.symmetric_keys, self.geometry.symmetries, agent_id, old_idx, new_idx, self.last_agent_played_id)
+        return state
+
+    # In-place counterpart of apply_action, every do_action must be reverted with undo (LIFO).
+    def do_action(self, agent_id, action):
+        new_idx = self.get_new_index(agent_id, action)
+        if self.undo_stack is None:
+            self.undo_stack = []
+        old_idx = self.positions[agent_id]
+        self.undo_stack.append((self.blocked, self.positions, self.last_actions, self.last_agent_played_id,
+                                self.hash_key, self.symmetric_keys))
+        if self.hash_key is not None:
+            self.hash_key ^= self.zobrist_keys().move_delta(agent_id, old_idx, new_idx, self.last_agent_played_id)
+        if self.symmetric_keys is not None:
+            self.symmetric_keys = self.zobrist_keys().symmetric_move_delta(
+                self.symmetric_keys, self.geometry.symmetries, agent_id, old_idx, new_idx, self.last_agent_played_id)
+        self.blocked |= 1 << new_idx
+        self.positions = self.positions[:agent_id] + (new_idx,) + self.positions[agent_id + 1:]
+        self.last_actions = self.last_actions[:agent_id] + (action,) + self.last_actions[agent_id + 1:]
+        self.last_agent_played_id = agent_id
+
+    def undo(self):
+        self.blocked, self.positions, self.last_actions, self.last_agent_played_id, self.hash_key, \
+            self.symmetric_keys = self.undo_stack.pop()
@@ -1,9 +1,19 @@
 import random
 
+import config
+
 from agents import Agent
+from minimax import MinimaxAB, MULTI_AGENT_MODES, chase_action
 from students import MinimaxABAgent, MaxNAgent
 
 
+def baseline_action(agent, alg, state, max_levels):
+    # search of the reference bots: one fixed-depth search of the game state, stopped at the agent's deadline
+    alg.deadline = agent.deadline
+    score, action = alg.search(state, max_levels, agent.get_id())
+    return action
+
+
 class BotAgent(Agent):
     agent_names = {'1': 'Aki', '2': 'Jocke', '3': 'Draza', '4': 'Bole'}
     ID = 0
@@ -23,13 +33,10 @@ class Aki(BotAgent):
         return '1'
 
     def get_next_action(self, state, max_levels):
+        # the first move that gets closest to the StudentAgent
         actions = self.get_legal_actions(state)
-        states_list = [state.apply_action(self.id, act) for act in actions]
-        coll = list(zip(actions, states_list))
-        if len(coll):
-            coll = sorted(coll, key=lambda st: sum(tuple(map(lambda i, j: abs(i - j),
-                          st[1].agents[0].position(), st[1].agents[self.id].position()))))
-            return coll[0][0]
+        if len(actions):
+            return chase_action(state, self.id, actions, 0)
         return None
 
 
@@ -47,6 +54,12 @@ class Jocke(BotAgent):
 
 
 class Draza(BotAgent, MinimaxABAgent):
+    upgrades = config.BOT_UPGRADES
+    # the bots never ponder, the endgame solver and the position database are only used by the upgraded search
+    ponder = False
+    solve_endgames = config.ENDGAME_SOLVER and config.BOT_UPGRADES
+    position_db = config.POSITION_DB if config.BOT_UPGRADES else None
+
     def __init__(self, position, file_name):
         MinimaxABAgent.__init__(self, position, file_name)
         BotAgent.__init__(self, position, file_name)
@@ -56,10 +69,18 @@ class Draza(BotAgent, MinimaxABAgent):
         return '3'
 
     def get_next_action(self, state, max_levels):
+        if not self.upgrades:
+            return baseline_action(self, MinimaxAB(), state, max_levels)
         return MinimaxABAgent.get_next_action(self, state, max_levels)
 
 
 class Bole(BotAgent, MaxNAgent):
+    mode = config.BOLE_MODE
+    upgrades = config.BOT_UPGRADES
+    ponder = False
+    solve_endgames = config.ENDGAME_SOLVER and config.BOT_UPGRADES
+    position_db = config.POSITION_DB if config.BOT_UPGRADES else None
+
     def __init__(self, position, file_name):
         MaxNAgent.__init__(self, position, file_name)
         BotAgent.__init__(self, position, file_name)
@@ -69,4 +90,6 @@ class Bole(BotAgent, MaxNAgent):
         return '4'
 
     def get_next_action(self, state, max_levels):
+        if not self.upgrades:
+            return baseline_action(self, MULTI_AGENT_MODES[self.mode](), state, max_levels)
         return MaxNAgent.get_next_action(self, state, max_levels)
@@ -10,6 +10,76 @@ GAME_SPEED = None
 GAME_FONT = None
 RIBBON_HEIGHT = None
 
+# search
+TT_MAX_ENTRIES = 2 ** 18
+TT_REPLACEMENT = 'two_tier'
+# share the transposition table entries between the mirror images and rotations of a position
+TT_SYMMETRY = False
+# half-width of the aspiration window around the previous iteration score (one move of mobility)
+ASPIRATION_WINDOW = 10
+# share of max_think_time an iterative deepening search plans to use
+ID_TIME_FRACTION = 0.7
+# share of max_think_time after which a running search is cancelled
+DEADLINE_FRACTION = 0.9
+# how often the game window is refreshed while an agent thinks (seconds)
+THINK_REFRESH_TIME = 0.05
+# worker processes of the parallel root split search (parallel.py) and how they are started
+SEARCH_WORKERS = os.cpu_count() or 1
+SEARCH_START_METHOD = 'spawn'
+# search of MaxNAgent and of the Bole bot: 'minimaxn', 'paranoid', 'brs' (best-reply search)
+# or 'maxn' (max^n with shallow pruning)
+MULTI_AGENT_MODE = 'minimaxn'
+BOLE_MODE = 'minimaxn'
+# give the reference bots Draza and Bole the StudentAgent search (iterative deepening, kept tables, endgame solver,
+# position database), otherwise they play the baseline fixed-depth MinimaxAB / BOLE_MODE search
+BOT_UPGRADES = False
+# leaf evaluation of the search agents: 'mobility', 'voronoi' or 'chamber' (see evaluators.py); the territory
+# evaluators are not cheaper, per leaf of the MinimaxABAgent searches on 11x11 boards: mobility 7-8 us,
+# voronoi 36-51 us, chamber 250-350 us
+EVALUATOR = 'mobility'
+# evaluate the leaves below a node in one NumPy batch (evaluators.BoardBatch), needs numpy; slower than
+# the one by one evaluation of BitboardState leaves on the board sizes of the game, so off by default
+BATCH_EVAL = False
+# pruning of ExpectAgent chance nodes: 0 - plain Expectimax, 1 - Star1, 2 - Star2
+EXPECTIMAX_STAR = 1
+# rival move probabilities of minimax.StarExpectimax: 'uniform' or 'chase' (weighted toward the bots.Aki move)
+EXPECTIMAX_MODEL = 'uniform'
+# probability mass the 'chase' model moves to the chase move
+EXPECTIMAX_CHASE_WEIGHT = 0.5
+# solve the game exactly once the StudentAgent is separated from every rival (see endgame.py)
+ENDGAME_SOLVER = True
+# larger separated regions are left to the regular search
+ENDGAME_MAX_CELLS = 40
+# share of the think time the endgame solver may use before the regular search takes over
+ENDGAME_TIME_FRACTION = 0.5
+# memoized walk lengths kept between moves
+ENDGAME_MAX_ENTRIES = 2 ** 20
+# sqlite database of searched root positions probed before every search (see positiondb.py), None - off
+POSITION_DB = None
+# open it read-only, e.g. to share a database built earlier between tournament workers
+POSITION_DB_READ_ONLY = False
+# a stored result stands in for a search with a think time but no depth limit if it is at least as deep as the
+# last such search of the agent reached, and at least this deep before the agent searched (the searches of
+# the game reach depth 9-11 in a second)
+POSITION_DB_MIN_DEPTH = 11
+# seconds a writer waits for the database lock held by another process
+POSITION_DB_TIMEOUT = 30
+# keep searching the position expected after the rivals' replies while they think (see ponder.py),
+# only the StudentAgent ponders
+PONDER = False
+# UCT exploration constant of mcts.MCTS (rewards are in [0, 1])
+MCTS_EXPLORATION = 1.4
+# playout policy of mcts.MCTS: 'random', 'chase' or 'mobility'
+MCTS_ROLLOUT_POLICY = 'random'
+# playouts per move when the think time is not known
+MCTS_ITERATIONS = 1000
+# collect stats.SearchStats on every StudentAgent search
+SEARCH_STATS = False
+# JSON lines file the search statistics of every move are appended to (None - no trace)
+STATS_TRACE_FILE = None
+# 'cprofile' or 'pyinstrument' profile of every search, written to PROFILE_FOLDER (None - no profiling)
+PROFILER = None
+
 # define colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -24,3 +94,5 @@ G_to_R = [((255 * i) / 100, (255 * (100 - i)) / 100, 0) for i in range(GR_LEN)]
 GAME_FOLDER = os.path.dirname(__file__)
 IMG_FOLDER = os.path.join(GAME_FOLDER, 'img')
 MAP_FOLDER = os.path.join(GAME_FOLDER, 'maps')
+PROFILE_FOLDER = os.path.join(GAME_FOLDER, 'profiles')
+RESULTS_FOLDER = os.path.join(GAME_FOLDER, 'results')
@@ -0,0 +1,90 @@
+import config
+
+from bitboard import to_bitboard
+
+
+def flood_fill(geometry, free: int, seeds: int) -> int:
+    # free cells connected (king moves) to the seed cells
+    region = frontier = seeds & free
+    while frontier:
+        frontier = geometry.dilate(frontier) & free & ~region
+        region |= frontier
+    return region
+
+
+def agent_region(state, agent_id: int) -> int:
+    # free cells the agent can still reach
+    state = to_bitboard(state)
+    idx = state.positions[agent_id]
+    return flood_fill(state.geometry, state.free_mask(), state.geometry.neighbour_masks[idx])
+
+
+def is_separated(state, agent_id: int) -> bool:
+    # no active rival can ever reach a cell the agent can reach, from here on the game is a race of
+    # independent longest walks
+    state = to_bitboard(state)
+    region = agent_region(state, agent_id)
+    return not any(agent_region(state, rival_id) & region for rival_id in range(len(state.positions))
+                   if rival_id != agent_id and state.active[rival_id])
+
+
+class EndgameSolver:
+    # Exact longest self-avoiding king walk of one agent in its separated region. Walk lengths are memoized
+    # on (position, reachable cells), the table is kept between moves: every move of the walk lands on an
+    # entry the previous solve already computed.
+    def __init__(self, max_entries: int = config.ENDGAME_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.memo = dict()
+        # util.Deadline of the current solve, Timeout is raised once it expires
+        self.deadline = None
+        self.nodes = 0
+
+    def solve(self, state, agent_id: int) -> (int, str):
+        # (moves the agent can still make, first move of the longest walk)
+        state = to_bitboard(state)
+        if len(self.memo) > self.max_entries:
+            self.memo.clear()
+        self.nodes = 0
+        geometry = state.geometry
+        free = state.free_mask()
+        region = agent_region(state, agent_id)
+        length, action = 0, None
+        for act_name, bit, idx in geometry.neighbours[state.positions[agent_id]]:
+            if not free & bit:
+                continue
+            tmp = 1 + self.longest(geometry, idx, region & ~bit)
+            if tmp > length:
+                length, action = tmp, act_name
+        return length, action
+
+    def longest(self, geometry, idx: int, free: int) -> int:
+        if self.deadline is not None:
+            self.deadline.check()
+        self.nodes += 1
+        neighbour_masks = geometry.neighbour_masks
+        reach = flood_fill(geometry, free, neighbour_masks[idx])
+        key = (idx, reach)
+        length = self.memo.get(key)
+        if length is not None:
+            return length
+        # the walk enters one of the parts the cell splits its region into and never comes back,
+        # so it can not be longer than the largest part
+        upper, parts, rest = 0, [], reach & neighbour_masks[idx]
+        while rest:
+            part = flood_fill(geometry, reach, rest & -rest)
+            parts.append(part)
+            upper = max(upper, bin(part).count('1'))
+            rest &= ~part
+        # Warnsdorff order: the neighbour with the fewest free neighbours first finds long walks early
+        moves = sorted((bin(neighbour_masks[n_idx] & reach).count('1'), n_idx, bit)
+                       for _, bit, n_idx in geometry.neighbours[idx] if reach & bit)
+        length = 0
+        for _, n_idx, bit in moves:
+            part = next(part for part in parts if part & bit)
+            if bin(part).count('1') <= length:
+                continue
+            length = max(length, 1 + self.longest(geometry, n_idx, part & ~bit))
+            if length == upper:
+                break
+        self.memo[key] = length
+        return length
@@ -0,0 +1,269 @@
+from actions import Action
+from bitboard import BitboardState, to_bitboard
+from states import ROAD
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise Exception(f'ERR: numpy is not installed, batched leaf evaluation needs it!')
+    return numpy
+
+
+class BoardBatch:
+    # Boards and agents of several states packed into NumPy arrays for the evaluate_batch methods. Boards get
+    # a blocked border and are flattened, so the neighbours of every cell are the same index offsets.
+    def __init__(self, states: list):
+        np = import_numpy()
+        self.np = np
+        first = states[0]
+        if isinstance(first, BitboardState):
+            geometry = first.geometry
+            rows, cols = geometry.rows, geometry.cols
+            n_bytes = (geometry.size + 7) // 8
+            raw = b''.join((geometry.full_mask & ~state.blocked).to_bytes(n_bytes, 'little') for state in states)
+            free = np.unpackbits(np.frombuffer(raw, dtype=np.uint8).reshape(len(states), n_bytes), axis=1,
+                                 bitorder='little')[:, :geometry.size].reshape(len(states), rows, cols)
+            agent_rows, agent_cols = np.divmod(np.array([state.positions for state in states]), cols)
+            self.active = np.array([state.active for state in states])
+        else:
+            rows, cols = len(first.char_map), len(first.char_map[0])
+            free = np.array([[[char == ROAD for char in row] for row in state.char_map] for state in states])
+            positions = np.array([[agent.position() for agent in state.agents] for state in states])
+            agent_rows, agent_cols = positions[:, :, 0], positions[:, :, 1]
+            self.active = np.array([[agent.is_active() for agent in state.agents] for state in states])
+        width = cols + 2
+        padded = np.zeros((len(states), rows + 2, width), dtype=bool)
+        padded[:, 1:-1, 1:-1] = free
+        self.free = padded.reshape(len(states), -1)
+        self.positions = (agent_rows + 1) * width + agent_cols + 1
+        self.offsets = [d_row * width + d_col for d_row, d_col in Action.actions.values()]
+        # legal moves of every agent, inactive agents have none
+        neighbours = self.positions[:, :, None] + np.array(self.offsets)
+        self.mobility = np.where(self.active, self.free[np.arange(len(states))[:, None, None], neighbours].sum(axis=2),
+                                 0)
+
+    def is_terminal(self):
+        # per state: some active agent can not move (minimax.is_terminal_state)
+        return ((self.mobility == 0) & self.active).any(axis=1)
+
+    def rival_mean(self, values, agent_id: int):
+        rivals = self.active.copy()
+        rivals[:, agent_id] = False
+        return (values * rivals).sum(axis=1) / rivals.sum(axis=1)
+
+
+class MobilityEvaluator:
+    # One step mobility: ten times the agent's legal moves minus the mean over its rivals.
+    name = 'mobility'
+
+    @staticmethod
+    def evaluate(state, agent_id: int) -> float:
+        curr_agent_eval = len(state.get_legal_actions(agent_id))
+        rival_ids = [agent.id for agent in state.agents if agent_id != agent.get_id() and agent.is_active()]
+        rival_agent_eval = sum(len(state.get_legal_actions(rival_id)) for rival_id in rival_ids)
+        rival_agent_eval = rival_agent_eval / len(rival_ids)
+        return 10 * (curr_agent_eval - rival_agent_eval)
+
+    @staticmethod
+    def evaluate_batch(batch: BoardBatch, agent_id: int) -> list:
+        return (10 * (batch.mobility[:, agent_id] - batch.rival_mean(batch.mobility, agent_id))).tolist()
+
+    @staticmethod
+    def bounds(state) -> (float, float):
+        return -10 * len(Action.actions), 10 * len(Action.actions)
+
+
+def rival_waves(geometry, free: int, sources: list) -> (list, list, dict):
+    # Independent BFS waves of the rivals (agent_id, cell bit) over the free cells. Per step r: the free cells no
+    # rival reaches in fewer than r steps, and the cells no rival reaches in at most r steps (every step of a walk
+    # on the board has an entry). Per rival: the cells it reaches in fewer steps than all the other rivals.
+    east, west, cols = geometry.east_sources, geometry.west_sources, geometry.cols
+    frontiers = [bit for _, bit in sources]
+    visited = list(frontiers)
+    reached = sum(frontiers)
+    open_cells = [free & ~reached]
+    unreached = [~reached]
+    owned = {agent_id: 0 for agent_id, _ in sources}
+    while True:
+        grown = 0
+        for k, frontier in enumerate(frontiers):
+            # BoardGeometry.dilate, inlined
+            cells = frontier | (frontier & east) << 1 | (frontier & west) >> 1
+            frontier = (cells | cells << cols | cells >> cols) & free & ~visited[k]
+            visited[k] |= frontier
+            frontiers[k] = frontier
+            grown |= frontier
+        if not grown:
+            open_cells += [free & ~reached] * (geometry.size - len(open_cells) + 1)
+            unreached += [~reached] * (geometry.size - len(unreached) + 1)
+            return open_cells, unreached, owned
+        first = grown & ~reached
+        if len(sources) == 1:
+            owned[sources[0][0]] |= first
+        else:
+            for k, (agent_id, _) in enumerate(sources):
+                others = 0
+                for i, frontier in enumerate(frontiers):
+                    if i != k:
+                        others |= frontier
+                owned[agent_id] |= frontiers[k] & first & ~others
+        reached |= grown
+        open_cells.append(free & ~reached)
+        unreached.append(~reached)
+
+
+# (key, rival_waves) of the last position evaluated, see voronoi
+last_waves = None
+
+
+def voronoi(state) -> list:
+    # Every active agent owns the free cells it reaches in fewer steps than any other active agent, cells
+    # reached first by several agents in the same step belong to nobody.
+    # Only the wave of the agent that moved last is searched from the position. The waves of its rivals are
+    # searched with its cell free and are reused while only its move differs, so the siblings of a search share
+    # them: a rival path through the mover's cell only leads to cells the mover reaches in fewer steps, so its
+    # cell changes no ownership, and its wave stops at the cells some rival reaches as soon as it does.
+    global last_waves
+    geometry = state.geometry
+    owned = [0] * len(state.positions)
+    active = [agent_id for agent_id, is_active in enumerate(state.active) if is_active]
+    if not active:
+        return owned
+    mover = state.last_agent_played_id if state.last_agent_played_id in active else active[0]
+    idx = state.positions[mover]
+    key = (state.blocked & ~(1 << idx), mover, state.positions[:mover] + state.positions[mover + 1:], state.active)
+    waves = last_waves
+    if waves is None or waves[0] != key:
+        sources = [(agent_id, 1 << state.positions[agent_id]) for agent_id in active if agent_id != mover]
+        waves = last_waves = key, rival_waves(geometry, state.free_mask() | 1 << idx, sources)
+    open_cells, unreached, rivals_owned = waves[1]
+    # BoardGeometry.dilate, inlined
+    east, west, cols = geometry.east_sources, geometry.west_sources, geometry.cols
+    frontier = visited = 1 << idx
+    cells = steps = 0
+    while frontier:
+        grown = frontier | (frontier & east) << 1 | (frontier & west) >> 1
+        # the mover's cell is visited, open_cells of the rivals' position are the free cells of this one
+        frontier = (grown | grown << cols | grown >> cols) & open_cells[steps] & ~visited
+        steps += 1
+        visited |= frontier
+        cells |= frontier & unreached[steps]
+    owned[mover] = cells
+    for agent_id, cells in rivals_owned.items():
+        owned[agent_id] = cells & ~visited
+    return owned
+
+
+def batch_voronoi(batch: BoardBatch):
+    # voronoi for the whole batch at once, returns the territory sizes (states x agents). Every cell holds
+    # a bitset of the agents whose wave reached it, so one array shift per direction grows all of them.
+    np = batch.np
+    states_num, agents_num = batch.active.shape
+    agent_bits = np.where(batch.active, 1 << np.arange(agents_num), 0).astype(np.uint32)
+    frontiers = np.zeros(batch.free.shape, dtype=np.uint32)
+    np.bitwise_or.at(frontiers, (np.arange(states_num)[:, None], batch.positions), agent_bits)
+    visited = frontiers.copy()
+    unreached = batch.free.copy()
+    owners = np.zeros_like(frontiers)
+    grown = np.empty_like(frontiers)
+    while True:
+        grown[:] = 0
+        for offset in batch.offsets:
+            if offset > 0:
+                grown[:, offset:] |= frontiers[:, :-offset]
+            else:
+                grown[:, :offset] |= frontiers[:, -offset:]
+        grown *= batch.free
+        grown &= ~visited
+        if not grown.any():
+            return np.stack([(owners >> agent_id & 1).sum(axis=1) for agent_id in range(agents_num)], axis=1)
+        visited |= grown
+        # cells first reached in this step, by a single agent
+        first = grown * unreached
+        owners |= first * ((first & (first - 1)) == 0)
+        unreached &= grown == 0
+        frontiers, grown = grown, frontiers
+
+
+class VoronoiEvaluator:
+    # Territory: the cells the agent reaches before any rival minus the mean territory of its rivals.
+    # An agent without a legal move has no territory. Only the wave of the agent that moved last is searched for
+    # each leaf (see voronoi), still a few times the cost of mobility (see config.EVALUATOR).
+    name = 'voronoi'
+
+    @staticmethod
+    def territories(state) -> list:
+        return [bin(cells).count('1') for cells in voronoi(state)]
+
+    @classmethod
+    def evaluate(cls, state, agent_id: int) -> float:
+        state = to_bitboard(state)
+        territory = cls.territories(state)
+        # inactive agents own no cells
+        rivals = sum(state.active) - state.active[agent_id]
+        return territory[agent_id] - (sum(territory) - territory[agent_id]) / rivals
+
+    @staticmethod
+    def evaluate_batch(batch: BoardBatch, agent_id: int) -> list:
+        territory = batch_voronoi(batch)
+        return (territory[:, agent_id] - batch.rival_mean(territory, agent_id)).tolist()
+
+    @staticmethod
+    def bounds(state) -> (float, float):
+        cells = to_bitboard(state).geometry.size
+        return -cells, cells
+
+
+def chamber_space(geometry, start: int, cells: int) -> int:
+    # Cells of the territory a walk from start can use. Depth first search (Tarjan) over the territory finds
+    # its articulation points: a subtree that only connects to the rest through such a cut cell is a chamber,
+    # a walk that enters it never comes back, so of all the chambers hanging off a cut cell only the largest
+    # counts. The agent's own cell is the root, every part of the territory around it is a chamber.
+    disc = {start: 0}
+    low = {start: 0}
+    # cells of the subtree and the usable ones among them
+    size = {start: 1}
+    space = {start: 1}
+    chamber = {start: 0}
+    stack = [(start, iter(geometry.neighbours[start]))]
+    while stack:
+        idx, neighbours = stack[-1]
+        for _, bit, n_idx in neighbours:
+            if not cells & bit:
+                continue
+            if n_idx not in disc:
+                disc[n_idx] = low[n_idx] = len(disc)
+                size[n_idx] = space[n_idx] = 1
+                chamber[n_idx] = 0
+                stack.append((n_idx, iter(geometry.neighbours[n_idx])))
+                break
+            low[idx] = min(low[idx], disc[n_idx])
+        else:
+            stack.pop()
+            space[idx] += chamber[idx]
+            if stack:
+                parent = stack[-1][0]
+                low[parent] = min(low[parent], low[idx])
+                if low[idx] >= disc[parent]:
+                    chamber[parent] = max(chamber[parent], space[idx])
+                else:
+                    space[parent] += space[idx]
+    return space[start] - 1
+
+
+class ChamberEvaluator(VoronoiEvaluator):
+    # Voronoi territory counting only the cells a walk can use (see chamber_space).
+    name = 'chamber'
+    # no batched variant, batched searches evaluate the leaves one by one
+    evaluate_batch = None
+
+    @staticmethod
+    def territories(state) -> list:
+        geometry = state.geometry
+        return [chamber_space(geometry, idx, cells) if active else 0
+                for cells, idx, active in zip(voronoi(state), state.positions, state.active)]
+
+
+EVALUATORS = {evaluator.name: evaluator for evaluator in (MobilityEvaluator, VoronoiEvaluator, ChamberEvaluator)}
@@ -1,18 +1,15 @@
 import os
 import sys
-import threading
 import time
 import pygame
 
 import config
 
-from queue import Queue
-from actions import Action
-from states import GameState
+from states import AgentState, GameState, load_map
 from bots import BotAgent, Aki
 from students import StudentAgent
 from tiles import Hole, Road, X
-from util import TimedFunction, Timeout
+from util import Deadline, Timeout, WaitTimeout, Worker
 
 
 class Quit(Exception):
@@ -28,7 +25,7 @@ class Game:
         self.game_steps = 0
         self.think_time = 0
         pygame.display.set_caption('PyStolovina')
-        self.char_map = Game.load_map(sys.argv[1] if len(sys.argv) > 1 else os.path.join(config.MAP_FOLDER, 'map0.txt'))
+        self.char_map = load_map(sys.argv[1] if len(sys.argv) > 1 else os.path.join(config.MAP_FOLDER, 'map0.txt'))
         # window scaling
         config.TILE_SIZE = min(config.MAX_HEIGHT // len(self.char_map), config.MAX_WIDTH // len(self.char_map[0]))
         config.HEIGHT = config.TILE_SIZE * len(self.char_map)
@@ -74,30 +71,28 @@ class Game:
             raise Exception(f'ERR: StudentAgent NOT defined!')
         self.max_think_time = int(sys.argv[3]) if len(sys.argv) > 3 else 1
         self.max_levels = int(sys.argv[4]) if len(sys.argv) > 4 else -1
-        GameState.initial_state = GameState(self.char_map, self.agents, None)
+        for agent in self.agents:
+            agent.max_think_time = self.max_think_time
+        agent_states = [AgentState.from_agent(agent) for agent in self.agents]
+        GameState.initial_state = GameState(self.char_map, agent_states, None)
         self.state = GameState.initial_state.copy()
+        self.worker = Worker()
         self.clock = pygame.time.Clock()
         self.running = True
         self.playing = False
         self.game_over = False
 
-    @staticmethod
-    def load_map(map_name):
-        try:
-            with open(map_name, 'r') as f:
-                matrix = []
-                while True:
-                    line = f.readline().strip()
-                    if not len(line):
-                        break
-                    matrix.append([c for c in line])
-            return matrix
-        except Exception as e:
-            raise e
+    def sync_agent(self, agent_id):
+        # sprites only mirror the pure-data agent records held by the game state
+        agent_state = self.state.agents[agent_id]
+        agent = self.agents[agent_id]
+        agent.place_to(agent_state.position())
+        agent.last_action = agent_state.get_last_action()
+        agent.set_active(agent_state.is_active())
 
     def activate_agent(self, agent_id):
         self.agents[agent_id].set_active(True)
-        self.state.agents[agent_id].set_active(True)
+        self.state.set_agent_active(agent_id, True)
         for x in self.x_sprites:
             if x.rect == self.agents[agent_id].rect:
                 self.x_sprites.remove(x)
@@ -106,19 +101,17 @@ class Game:
 
     def deactivate_agent(self, agent_id):
         self.agents[agent_id].set_active(False)
-        self.state.agents[agent_id].set_active(False)
+        self.state.set_agent_active(agent_id, False)
         self.x_sprites.add(X(self.agents[agent_id].position()))
         self.draw()
 
     def check_game_status(self):
         self.state.adjust_win_loss()
-        for agent_id in range(len(self.agents)):
-            if self.agents[agent_id].is_active() and not self.agents[agent_id].get_legal_actions(self.state):
-                self.deactivate_agent(agent_id)
+        for agent_id in self.state.get_stuck_agent_ids():
+            self.deactivate_agent(agent_id)
 
-        if self.state.is_win() or self.state.is_loss() or all(not agent.is_active() for agent in self.agents):
-            if self.state.last_agent_played_id is not None and \
-                    all([not len(self.state.get_legal_actions(agent_id)) for agent_id in range(len(self.agents))]):
+        if self.state.is_game_over():
+            if self.state.last_agent_played_id is not None and self.state.is_blocked():
                 self.activate_agent(self.state.last_agent_played_id)
             raise GameOver()
 
@@ -134,33 +127,29 @@ class Game:
                                 continue
                             legal_actions = agent.get_legal_actions(self.state)
                             try:
-                                tf_queue = Queue(1)
-                                tf = TimedFunction(threading.current_thread().ident,
-                                                   tf_queue, self.max_think_time, agent.get_next_action, self.state,
-                                                   self.max_levels)
-                                tf.setDaemon(True)
-                                tf.start()
-                                start_time = time.time()
-                                sleep_time = 0.001
-                                while tf_queue.empty():
-                                    time.sleep(sleep_time)
-                                    self.think_time = time.time() - start_time
-                                    self.draw_ribbon()
-                                    self.events()
-                                action, elapsed = tf_queue.get(block=False)
+                                action, elapsed = self.think(agent)
                                 print(f'Action time elapsed: {elapsed:.3f}')
                             except Timeout:
                                 print(f'WARN: Agent {agent_id} action took more than {self.max_think_time} seconds!')
                                 self.deactivate_agent(agent_id)
                                 continue
+                            except (Quit, GameOver):
+                                raise
+                            except Exception as e:
+                                print(f'WARN: Agent {agent_id} failed to choose an action: {e!r}')
+                                self.deactivate_agent(agent_id)
+                                continue
                             if not legal_actions or action is None or action not in legal_actions:
                                 self.deactivate_agent(agent_id)
                                 continue
                             print(f'On position {agent.position()} Agent {agent_id} chose action {action} from '
                                   f'legal actions {legal_actions}')
                             self.state = self.state.apply_action(agent_id, action)
+                            if not agent_id:
+                                # the StudentAgent may search on while the others think and move
+                                agent.start_pondering(self.state, self.max_levels)
                             old_position = agent.position()
-                            new_position = tuple(map(sum, zip(agent.position(), Action.actions[action])))
+                            new_position = self.state.agents[agent_id].position()
                             while True:
                                 agent.move_towards(new_position)
                                 if agent.is_in_tile():
@@ -176,12 +165,13 @@ class Game:
                                 self.events()
                                 while not self.playing:
                                     self.events()
-                            agent.place_to(new_position)
+                            self.sync_agent(agent_id)
                         self.game_steps += 1
                         self.draw_ribbon()
                     self.events()
                 except GameOver:
                     self.game_over = True
+                    self.agents[0].stop_pondering()
                     self.draw()
         except Quit:
             self.quit()
@@ -189,9 +179,43 @@ class Game:
             self.quit()
             raise e
 
+    def think(self, agent):
+        # The agent searches on the worker thread while this thread keeps the window responsive, searches
+        # stop cooperatively at the agent's deadline. A worker still busy after max_think_time is abandoned,
+        # a Timeout raised by the agent itself ends the turn at once. The StudentAgent does not ponder while
+        # a rival searches, the rival keeps all of its think time.
+        searches = agent.get_id() and isinstance(agent, StudentAgent)
+        if searches:
+            self.agents[0].pause_pondering(True)
+        try:
+            return self.wait_for_action(agent)
+        finally:
+            if searches:
+                self.agents[0].pause_pondering(False)
+
+    def wait_for_action(self, agent):
+        deadline = Deadline(self.max_think_time * config.DEADLINE_FRACTION)
+        agent.deadline = deadline
+        self.worker.submit(agent.get_next_action, self.state, self.max_levels)
+        start_time = time.time()
+        while True:
+            remaining = self.max_think_time - (time.time() - start_time)
+            try:
+                return self.worker.result(timeout=max(0, min(config.THINK_REFRESH_TIME, remaining)))
+            except WaitTimeout:
+                self.think_time = time.time() - start_time
+                if self.think_time >= self.max_think_time:
+                    deadline.cancel()
+                    self.worker.stop()
+                    self.worker = Worker()
+                    raise Timeout()
+                self.draw_ribbon()
+                self.events()
+
     def quit(self):
         self.game_over = True
         self.running = False
+        self.agents[0].stop_pondering()
 
     def draw_ribbon(self):
         self.screen.fill(config.BLACK, rect=(0, config.HEIGHT, config.WIDTH, config.RIBBON_HEIGHT))
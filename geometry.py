@@ -0,0 +1,117 @@
+from collections import namedtuple
+
+from actions import Action
+
+# one board symmetry: cells[idx] - index of the image of cell idx, actions / inverse - action name -> its image
+# and back
+Symmetry = namedtuple('Symmetry', ['cells', 'actions', 'inverse'])
+
+
+def transform_move(move, actions: dict):
+    # moves stored by the searches are action names, (agent_id, action) pairs or None
+    if move is None:
+        return None
+    if isinstance(move, tuple):
+        return move[0], actions[move[1]]
+    return actions[move]
+
+
+class BoardGeometry:
+    # Neighbour tables shared by every state of the same board size (cell index = row * cols + col), so bounds
+    # checks and coordinate arithmetic of the moves are done once per board size instead of on every call.
+    cache = dict()
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.full_mask = (1 << self.size) - 1
+        # per cell: ((action_name, neighbour_bit, neighbour_index), ...) in Action.actions order
+        self.neighbours = []
+        # per cell: {action_name: neighbour_index}
+        self.moves = []
+        # per cell: ((action_name, neighbour_row, neighbour_col), ...), the same neighbours for GameState
+        self.steps = []
+        # per cell: {action_name: (neighbour_row, neighbour_col)}
+        self.targets = []
+        # per cell: mask of all in-bounds neighbours
+        self.neighbour_masks = []
+        # per cell: {free neighbours mask: legal action names}, filled lazily
+        self.legal_actions = []
+        for idx in range(self.size):
+            row, col = divmod(idx, cols)
+            cell_neighbours = []
+            for act_name, (d_row, d_col) in Action.actions.items():
+                n_row, n_col = row + d_row, col + d_col
+                if 0 <= n_row < rows and 0 <= n_col < cols:
+                    n_idx = n_row * cols + n_col
+                    cell_neighbours.append((act_name, 1 << n_idx, n_idx))
+            self.neighbours.append(tuple(cell_neighbours))
+            self.moves.append({name: n_idx for name, _, n_idx in cell_neighbours})
+            self.steps.append(tuple((name,) + divmod(n_idx, cols) for name, _, n_idx in cell_neighbours))
+            self.targets.append({name: divmod(n_idx, cols) for name, _, n_idx in cell_neighbours})
+            mask = 0
+            for _, bit, _ in cell_neighbours:
+                mask |= bit
+            self.neighbour_masks.append(mask)
+            self.legal_actions.append(dict())
+        # cells that have a neighbour to the east / to the west, see dilate
+        self.east_sources = self.west_sources = 0
+        for idx in range(self.size):
+            col = idx % cols
+            if col < cols - 1:
+                self.east_sources |= 1 << idx
+            if col > 0:
+                self.west_sources |= 1 << idx
+        # transforms that map the board onto itself, the identity first
+        self.symmetries = self.build_symmetries()
+
+    def build_symmetries(self):
+        # the dihedral group D4 (rotations and reflections) on square boards, only the flips and the half turn on
+        # rectangular ones; the king moves are symmetric under all of them
+        rows, cols = self.rows, self.cols
+        transforms = [lambda row, col: (row, col),
+                      lambda row, col: (rows - 1 - row, col),
+                      lambda row, col: (row, cols - 1 - col),
+                      lambda row, col: (rows - 1 - row, cols - 1 - col)]
+        if rows == cols:
+            transforms += [lambda row, col: (col, row),
+                           lambda row, col: (cols - 1 - col, rows - 1 - row),
+                           lambda row, col: (col, rows - 1 - row),
+                           lambda row, col: (cols - 1 - col, row)]
+        directions = {direction: act_name for act_name, direction in Action.actions.items()}
+        symmetries = []
+        for transform in transforms:
+            cells = tuple(self.index(transform(*self.position(idx))) for idx in range(self.size))
+            # the transforms are affine, a direction maps to the difference of the images of its ends
+            origin = transform(0, 0)
+            actions = dict()
+            for act_name, (d_row, d_col) in Action.actions.items():
+                n_row, n_col = transform(d_row, d_col)
+                actions[act_name] = directions[(n_row - origin[0], n_col - origin[1])]
+            symmetries.append(Symmetry(cells, actions, {image: act_name for act_name, image in actions.items()}))
+        return symmetries
+
+    @staticmethod
+    def get(rows, cols):
+        geometry = BoardGeometry.cache.get((rows, cols))
+        if geometry is None:
+            geometry = BoardGeometry(rows, cols)
+            BoardGeometry.cache[(rows, cols)] = geometry
+        return geometry
+
+    def __reduce__(self):
+        # pickled by size only, a receiving process (see parallel.py) uses its own cached tables
+        return BoardGeometry.get, (self.rows, self.cols)
+
+    def dilate(self, mask):
+        # the mask cells and all their in-bounds neighbours: king moves are a step along the row followed by a step
+        # along the column, so two shifts per axis instead of one per direction or a loop over cells
+        grown = mask | (mask & self.east_sources) << 1 | (mask & self.west_sources) >> 1
+        return (grown | grown << self.cols | grown >> self.cols) & self.full_mask
+
+    def index(self, position):
+        return position[0] * self.cols + position[1]
+
+    def position(self, idx):
+        return divmod(idx, self.cols)
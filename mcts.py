@@ -0,0 +1,227 @@
+import math
+import random
+import time
+
+import config
+
+from actions import Action
+from states import GameState
+from util import manhattan
+
+
+def random_policy(state: GameState, agent_id: int, actions: list, rnd) -> str:
+    # bots.Jocke
+    return actions[rnd.randrange(len(actions))]
+
+
+def chase_policy(state: GameState, agent_id: int, actions: list, rnd) -> str:
+    # bots.Aki: bots step towards the StudentAgent, the StudentAgent towards its nearest rival
+    agent_pos = state.agents[agent_id].position()
+    if agent_id:
+        target = state.agents[0].position()
+    else:
+        rivals = [agent.position() for agent in state.agents[1:] if agent.is_active()]
+        if not rivals:
+            return random_policy(state, agent_id, actions, rnd)
+        target = min(rivals, key=lambda pos: manhattan(agent_pos, pos))
+    best, best_distance = [], math.inf
+    for act in actions:
+        d_row, d_col = Action.actions[act]
+        distance = manhattan((agent_pos[0] + d_row, agent_pos[1] + d_col), target)
+        if distance < best_distance:
+            best, best_distance = [act], distance
+        elif distance == best_distance:
+            best.append(act)
+    return best[rnd.randrange(len(best))]
+
+
+def mobility_policy(state: GameState, agent_id: int, actions: list, rnd) -> str:
+    # the move that leaves the agent the most legal moves
+    best, best_mobility = [], -1
+    for act in actions:
+        state.do_action(agent_id, act)
+        mobility = len(state.get_legal_actions(agent_id))
+        state.undo()
+        if mobility > best_mobility:
+            best, best_mobility = [act], mobility
+        elif mobility == best_mobility:
+            best.append(act)
+    return best[rnd.randrange(len(best))]
+
+
+ROLLOUT_POLICIES = {'random': random_policy, 'chase': chase_policy, 'mobility': mobility_policy}
+
+
+def eliminate(state: GameState, ranks: tuple) -> tuple:
+    # ranks[agent_id] - None while the agent can move, otherwise the number of agents that dropped out
+    # before it; agents left without a legal move drop out together, as game.Game deactivates them
+    stuck = [agent_id for agent_id, rank in enumerate(ranks)
+             if rank is None and not state.get_legal_actions(agent_id)]
+    if not stuck:
+        return ranks
+    out = sum(rank is not None for rank in ranks)
+    ranks = list(ranks)
+    for agent_id in stuck:
+        ranks[agent_id] = out
+    return tuple(ranks)
+
+
+def is_over(ranks: tuple) -> bool:
+    # the game ends when the StudentAgent or all the bots are stuck (GameState.adjust_win_loss)
+    return ranks[0] is not None or all(rank is not None for rank in ranks[1:])
+
+
+def next_to_move(ranks: tuple, last_id: int) -> int:
+    agents_num = len(ranks)
+    for step in range(1, agents_num + 1):
+        agent_id = (last_id + step) % agents_num
+        if ranks[agent_id] is None:
+            return agent_id
+    return None
+
+
+def rewards(ranks: tuple, last_id: int) -> list:
+    # max^n style reward vector in [0, 1]: agents still moving get 1, the others the share of agents they
+    # outlasted; if everybody got stuck at once the last agent that played wins, as in GameState
+    agents_num = len(ranks)
+    if all(rank is not None for rank in ranks):
+        ranks = ranks[:last_id] + (None,) + ranks[last_id + 1:]
+    return [1.0 if rank is None else rank / max(agents_num - 1, 1) for rank in ranks]
+
+
+class MCTSNode:
+    __slots__ = ('state', 'ranks', 'mover', 'to_move', 'parent', 'action', 'children', 'untried', 'visits',
+                 'rewards')
+
+    def __init__(self, state: GameState, ranks: tuple, mover: int, parent=None, action: str = None):
+        self.state = state
+        self.ranks = ranks
+        # agent that played the move leading here and the one on turn (None in a terminal node)
+        self.mover = mover
+        self.to_move = None if is_over(ranks) else next_to_move(ranks, mover)
+        self.parent = parent
+        self.action = action
+        # action -> MCTSNode
+        self.children = dict()
+        self.untried = state.get_legal_actions(self.to_move) if self.to_move is not None else []
+        self.visits = 0
+        # summed reward vector of all playouts through this node
+        self.rewards = [0.0] * len(ranks)
+
+    def depth(self) -> int:
+        if not self.children:
+            return 0
+        return 1 + max(child.depth() for child in self.children.values())
+
+
+class MCTS:
+    # Monte Carlo tree search with UCT selection for N agents. Every agent picks the child best for itself
+    # (max^n), playouts are played to the end of the game with one of ROLLOUT_POLICIES. The tree is kept
+    # between moves and the subtree of the position actually reached is reused.
+
+    def __init__(self, exploration: float = config.MCTS_EXPLORATION,
+                 rollout_policy: str = config.MCTS_ROLLOUT_POLICY, seed: int = None):
+        if rollout_policy not in ROLLOUT_POLICIES:
+            raise Exception(f'ERR: {rollout_policy} is not a rollout policy! '
+                            f'Rollout policies are ({", ".join(ROLLOUT_POLICIES.keys())})')
+        self.exploration = exploration
+        self.policy = ROLLOUT_POLICIES[rollout_policy]
+        # the module generator unless seeded, so that simulation seeds reproduce games
+        self.rnd = random.Random(seed) if seed is not None else random
+        # util.Deadline of the current move, the search stops before it expires
+        self.deadline = None
+        self.root = None
+        self.last_action = None
+        self.iterations = 0
+        self.reused = False
+
+    def search(self, state: GameState, curr_agent_id: int, time_limit: float = None, iterations: int = None,
+               max_depth: int = -1) -> (float, str):
+        # anytime: plays out until time_limit seconds passed, the deadline expired or iterations ran out
+        root = self.reuse(state, curr_agent_id)
+        self.reused = root is not None
+        if root is None:
+            ranks = eliminate(state, tuple(None if agent.is_active() else 0 for agent in state.agents))
+            # as if the agent before us just played, so that we are on turn
+            root = MCTSNode(state.copy(), ranks, (curr_agent_id - 1) % len(ranks))
+        self.root = root
+        self.iterations = 0
+        if root.to_move is None:
+            self.last_action = None
+            return 0.0, None
+        start_time = time.perf_counter()
+        while True:
+            self.iterate(root, max_depth)
+            self.iterations += 1
+            if len(root.children) + len(root.untried) == 1:
+                break
+            if iterations is not None and self.iterations >= iterations:
+                break
+            if time_limit is not None and time.perf_counter() - start_time >= time_limit:
+                break
+            if self.deadline is not None and self.deadline.expired():
+                break
+        child = max(root.children.values(), key=lambda node: node.visits)
+        self.last_action = child.action
+        return child.rewards[curr_agent_id] / child.visits, child.action
+
+    def reuse(self, state: GameState, curr_agent_id: int) -> MCTSNode:
+        # follows our last move and the last actions of the agents after us down the old tree
+        if self.root is None or self.last_action not in self.root.children:
+            return None
+        node = self.root.children[self.last_action]
+        while node is not None and node.to_move is not None and node.to_move != curr_agent_id:
+            node = node.children.get(state.agents[node.to_move].get_last_action())
+        if node is None or node.to_move != curr_agent_id or str(node.state) != str(state):
+            return None
+        node.parent = None
+        return node
+
+    def iterate(self, root: MCTSNode, max_depth: int):
+        node, depth = root, 0
+        # selection
+        while node.to_move is not None and not node.untried and (max_depth < 0 or depth < max_depth):
+            node = self.select(node)
+            depth += 1
+        # expansion
+        if node.untried and (max_depth < 0 or depth < max_depth):
+            node = self.expand(node)
+        # simulation
+        if node.to_move is None:
+            result = rewards(node.ranks, node.mover)
+        else:
+            result = self.rollout(node)
+        # backpropagation
+        while node is not None:
+            node.visits += 1
+            node_rewards = node.rewards
+            for agent_id, reward in enumerate(result):
+                node_rewards[agent_id] += reward
+            node = node.parent
+
+    def select(self, node: MCTSNode) -> MCTSNode:
+        agent_id = node.to_move
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        return max(node.children.values(),
+                   key=lambda child: child.rewards[agent_id] / child.visits +
+                   exploration * math.sqrt(log_visits / child.visits))
+
+    def expand(self, node: MCTSNode) -> MCTSNode:
+        action = node.untried.pop(self.rnd.randrange(len(node.untried)))
+        state = node.state.apply_action(node.to_move, action)
+        child = MCTSNode(state, eliminate(state, node.ranks), node.to_move, node, action)
+        node.children[action] = child
+        return child
+
+    def rollout(self, node: MCTSNode) -> list:
+        state = node.state.copy()
+        ranks, mover, agent_id = node.ranks, node.mover, node.to_move
+        policy, rnd = self.policy, self.rnd
+        while True:
+            state.do_action(agent_id, policy(state, agent_id, state.get_legal_actions(agent_id), rnd))
+            mover = agent_id
+            ranks = eliminate(state, ranks)
+            if is_over(ranks):
+                return rewards(ranks, mover)
+            agent_id = next_to_move(ranks, mover)
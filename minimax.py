@@ -1,5 +1,55 @@
 import math
+import time
+
+import config
+
+from actions import Action
+from evaluators import BoardBatch, MobilityEvaluator
+from geometry import transform_move
 from states import GameState
+from util import Deadline, Timeout, manhattan
+from ordering import MoveOrdering
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+
+def is_terminal_state(state: GameState) -> bool:
+    for _id in [agent.id for agent in state.agents if agent.is_active()]:
+        if len(state.get_legal_actions(_id)) == 0:
+            return True
+    return False
+
+
+def get_rival_ids(state: GameState, agent_id: int) -> list[int]:
+    return [agent.id for agent in state.agents if (agent_id != agent.get_id()) and agent.is_active()]
+
+
+def next_agent_id(state: GameState, agent_id: int) -> int:
+    # the next active agent in the game turn order
+    agents_num = len(state.agents)
+    for step in range(1, agents_num + 1):
+        next_id = (agent_id + step) % agents_num
+        if state.agents[next_id].is_active():
+            return next_id
+    return agent_id
+
+
+def tt_move_first(moves: list, tt_move) -> list:
+    # moves are action names, Nodes or (agent_id, action) pairs, the stored best move is expanded first
+    if tt_move is not None:
+        moves.sort(key=lambda m: (m.get_direction() if isinstance(m, Node) else m) != tt_move)
+    return moves
+
+
+def expand(state: GameState, agent_id: int, actions: list = None, key=None):
+    # (action, child state) pairs generated on demand, a child state is only copied once the search gets to it,
+    # so a cutoff saves the copies of all the later children; actions - already ordered moves, default the legal
+    # moves, key - optional sort key of the actions
+    if actions is None:
+        actions = state.get_legal_actions(agent_id)
+    if key is not None:
+        actions = sorted(actions, key=key)
+    for act in actions:
+        yield act, state.apply_action(agent_id, act)
 
 
 class Node:
@@ -8,9 +58,17 @@ class Node:
         self.dir = direction
         pass
 
-    def successors(self, agent_id: int) -> list:
+    # node of the child state reached by the action of agent_id
+    def child(self, state: GameState, action: str, agent_id: int) -> 'Node':
         pass
 
+    def expand(self, agent_id: int, actions: list = None, key=None):
+        for act, state in expand(self.state, agent_id, actions, key):
+            yield self.child(state, act, agent_id)
+
+    def successors(self, agent_id: int) -> list:
+        return list(self.expand(agent_id))
+
     def get_state(self) -> GameState:
         return self.state
 
@@ -21,52 +79,86 @@ class Node:
         return self.dir
 
     def is_terminal(self, agent_id: int) -> bool:
-        for _id in [agent.id for agent in self.state.agents if agent.is_active()]:
-            if len(self.state.get_legal_actions(_id)) == 0:
-                return True
-        return False
+        return is_terminal_state(self.state)
 
     def get_rival_ids(self, agent_id: int) -> list[int]:
-        return [agent.id for agent in self.state.agents if (agent_id != agent.get_id()) and agent.is_active()]
+        return get_rival_ids(self.state, agent_id)
 
 
 class Minimax:
     class MaxNode(Node):
-        def successors(self, agent_id: int):
-            actions = self.state.get_legal_actions(agent_id)
-            states_list = [self.state.apply_action(agent_id, act) for act in actions]
-            successors = [Minimax.MinNode(states_list[i], actions[i]) for i in range(len(states_list))]
-            return successors
+        def child(self, state: GameState, action: str, agent_id: int) -> Node:
+            return Minimax.MinNode(state, action)
 
     class MinNode(Node):
-        def successors(self, agent_id: int):
-            actions = self.state.get_legal_actions(agent_id)
-            states_list = [self.state.apply_action(agent_id, act) for act in actions]
-            successors = [Minimax.MaxNode(states_list[i], actions[i]) for i in range(len(states_list))]
-            return successors
+        def child(self, state: GameState, action: str, agent_id: int) -> Node:
+            return Minimax.MaxNode(state, action)
 
-    @staticmethod
-    def eval(node: Node, agent_id: int) -> float:
-        curr_agent_eval = len(node.get_state().get_legal_actions(agent_id))
-        rival_ids = node.get_rival_ids(agent_id)
-        rival_agent_eval = sum(len(node.get_state().get_legal_actions(rival_id)) for rival_id in rival_ids)
-        rival_agent_eval = rival_agent_eval / len(rival_ids)
-        return 10 * (curr_agent_eval - rival_agent_eval)
+    # leaf evaluation, one of evaluators.EVALUATORS
+    evaluator = MobilityEvaluator
+
+    def eval(self, node: Node, agent_id: int) -> float:
+        return self.eval_state(node.get_state(), agent_id)
+
+    def eval_state(self, state: GameState, agent_id: int) -> float:
+        return self.evaluator.evaluate(state, agent_id)
+
+    # evaluate the children of nodes one ply above the leaves together, in one evaluator batch call
+    batch_eval = config.BATCH_EVAL
+
+    def eval_batch(self, states: list, agent_id: int) -> list:
+        batch = BoardBatch(states)
+        if not batch.is_terminal().all():
+            self.depth_limited = True
+        return self.evaluator.evaluate_batch(batch, agent_id)
+
+    def is_batch_leaf(self, depth: int) -> bool:
+        return depth == 1 and self.batch_eval and self.evaluator.evaluate_batch is not None
+
+    def leaf_values(self, state: GameState, depth: int, agent_id: int, actions: list, curr_agent_id: int) -> dict:
+        # action -> value of the child, None if the children are searched one by one
+        if not actions or not self.is_batch_leaf(depth):
+            return None
+        children = []
+        for act in actions:
+            self.tick(0)
+            state.do_action(agent_id, act)
+            children.append(state.copy())
+            state.undo()
+        return dict(zip(actions, self.eval_batch(children, curr_agent_id)))
+
+    def expand_node(self, node: Node, depth: int, agent_id: int, curr_agent_id: int, actions: list = None):
+        # Node variant of leaf_values: (children of the node, a value per child or None), the children are
+        # generated lazily unless the batch evaluation needs them all at once
+        successors = node.expand(agent_id, actions)
+        if not self.is_batch_leaf(depth):
+            return successors, None
+        successors = list(successors)
+        if not successors:
+            return successors, None
+        for _ in successors:
+            self.tick(0)
+        return successors, self.eval_batch([s.get_state() for s in successors], curr_agent_id)
 
     @staticmethod
     def is_terminal(node: Node, curr_agent_id: int) -> bool:
         return node.is_terminal(curr_agent_id)
 
     def run(self, node: Node, depth: int, curr_agent_id: int) -> (float, Node):
-        if self.is_terminal(node, curr_agent_id) or depth == 0:
+        self.tick(depth)
+        if self.is_terminal(node, curr_agent_id) or self.is_depth_limit(depth):
             return self.eval(node, curr_agent_id), node
 
         if isinstance(node, Minimax.MaxNode):
             # MAX
             score = -math.inf
             n = None
-            for s in node.successors(curr_agent_id):
-                tmp, n_tmp = self.run(s, depth - 1, curr_agent_id)
+            successors, values = self.expand_node(node, depth, curr_agent_id, curr_agent_id)
+            for i, s in enumerate(successors):
+                if values is not None:
+                    tmp = values[i]
+                else:
+                    tmp, n_tmp = self.run(s, depth - 1, curr_agent_id)
                 if score < tmp:
                     score = tmp
                     n = s
@@ -77,79 +169,380 @@ class Minimax:
             score = math.inf
             n = None
             rival_id = node.get_rival_ids(curr_agent_id)
-            for s in node.successors(rival_id[0]):
-                tmp, n_tmp = self.run(s, depth - 1, curr_agent_id)
+            successors, values = self.expand_node(node, depth, rival_id[0], curr_agent_id)
+            for i, s in enumerate(successors):
+                if values is not None:
+                    tmp = values[i]
+                else:
+                    tmp, n_tmp = self.run(s, depth - 1, curr_agent_id)
                 if score > tmp:
                     score = tmp
                     n = s
 
             return score, n
 
+    # set when a search stops at the depth limit instead of at the end of the game
+    depth_limited = False
+    # util.Deadline checked on every node, the search raises util.Timeout once it expires
+    deadline = None
+    nodes = 0
+    # alpha-beta cutoffs of the last search
+    cutoffs = 0
+
+    # stats.SearchStats collecting the statistics of the search, None if they are not collected
+    stats = None
+
+    # depth left below the node
+    def tick(self, depth: int):
+        self.nodes += 1
+        if self.deadline is not None:
+            self.deadline.check()
+
+    # index - position of the move that caused the cutoff in the ordered move list
+    def cutoff(self, index: int):
+        self.cutoffs += 1
+
+    def is_depth_limit(self, depth: int) -> bool:
+        if depth == 0:
+            self.depth_limited = True
+            return True
+        return False
+
+    # called once per move, before the first search of that move
+    def start_search(self):
+        pass
+
+    def search(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        score, node = self.run(self.MaxNode(state), depth, curr_agent_id)
+        return score, node.get_direction()
+
+    # Make/unmake variants walk a single private copy of the state with do_action/undo
+    # instead of allocating a GameState per node, they return the best action instead of a Node.
+    def search_in_place(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        return self.run_in_place(state.copy(), depth, curr_agent_id)
+
+    # Score of a single root move, the root moves are searched in separate processes by parallel.py.
+    # alpha - score of a root move searched before, the pruning searches only prove whether this move beats it
+    # (a score not above alpha is an upper bound), the others ignore it.
+    def search_move(self, state: GameState, depth: int, curr_agent_id: int, action: str,
+                    alpha: float = -math.inf) -> float:
+        state = state.copy()
+        state.do_action(curr_agent_id, action)
+        return self.run_in_place(state, depth - 1, curr_agent_id, False)[0]
+
+    def run_in_place(self, state: GameState, depth: int, curr_agent_id: int, maximizing: bool = True) -> (float, str):
+        self.tick(depth)
+        if is_terminal_state(state) or self.is_depth_limit(depth):
+            return self.eval_state(state, curr_agent_id), None
+
+        if maximizing:
+            # MAX
+            score = -math.inf
+            action = None
+            actions = state.get_legal_actions(curr_agent_id)
+            values = self.leaf_values(state, depth, curr_agent_id, actions, curr_agent_id)
+            for act in actions:
+                if values is not None:
+                    tmp = values[act]
+                else:
+                    state.do_action(curr_agent_id, act)
+                    tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, False)
+                    state.undo()
+                if score < tmp:
+                    score = tmp
+                    action = act
+
+            return score, action
+        else:
+            # MIN
+            score = math.inf
+            action = None
+            rival_id = get_rival_ids(state, curr_agent_id)
+            actions = state.get_legal_actions(rival_id[0])
+            values = self.leaf_values(state, depth, rival_id[0], actions, curr_agent_id)
+            for act in actions:
+                if values is not None:
+                    tmp = values[act]
+                else:
+                    state.do_action(rival_id[0], act)
+                    tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, True)
+                    state.undo()
+                if score > tmp:
+                    score = tmp
+                    action = act
+
+            return score, action
+
 
 class MinimaxAB(Minimax):
+    # width of the null window used by principal variation search, smaller than any eval difference
+    PVS_EPSILON = 1e-6
+
+    def __init__(self, tt: TranspositionTable = None, ordering: MoveOrdering = None, pvs: bool = False,
+                 aspiration: float = None):
+        self.tt = tt
+        self.ordering = ordering
+        # search every move after the first one with a null window, re-search only if it proves better
+        self.pvs = pvs
+        # half-width of the root window around the score of the previous iteration (None - full window)
+        self.aspiration = aspiration
+        self.prev_score = None
+        self.aspiration_researches = 0
+
+    def start_search(self):
+        self.prev_score = None
+        if self.tt is not None:
+            self.tt.new_search()
+        if self.ordering is not None:
+            self.ordering.new_search()
+
+    def order_moves(self, state: GameState, agent_id: int, moves: list, ply: int, tt_move: str) -> list:
+        if self.ordering is None:
+            return tt_move_first(moves, tt_move)
+        key = Node.get_direction if moves and isinstance(moves[0], Node) else None
+        return self.ordering.order(state, agent_id, moves, ply, tt_move, key)
+
+    def tt_key(self, state: GameState) -> (int, int):
+        # (table key, index of the state.geometry.symmetries transform it belongs to)
+        return state.canonical_hash() if self.tt.symmetric else (state.zobrist_hash(), 0)
+
+    def probe_tt(self, state: GameState, depth: float, alpha: float, beta: float, ply: int):
+        # returns (score if the stored bound cuts this node off or None, stored best move, alpha, beta)
+        key, symmetry = self.tt_key(state)
+        entry = self.tt.probe(key)
+        if entry is None:
+            return None, None, alpha, beta
+        move = transform_move(entry.move, state.geometry.symmetries[symmetry].inverse) if symmetry else entry.move
+        if ply and entry.depth >= depth:
+            if entry.flag != EXACT:
+                if entry.flag == LOWER:
+                    alpha = max(alpha, entry.score)
+                else:
+                    beta = min(beta, entry.score)
+            if entry.flag == EXACT or alpha >= beta:
+                # a score of a depth-limited search stands in for the subtree, so this search is depth-limited too
+                if entry.depth != math.inf:
+                    self.depth_limited = True
+                return entry.score, move, alpha, beta
+        return None, move, alpha, beta
 
-    def run(self, node: Node, depth: int, curr_agent_id: int, alpha: float, beta: float) -> (float, Node):
-        if self.is_terminal(node, curr_agent_id) or depth == 0:
+    def store_tt(self, state: GameState, depth: float, score: float, alpha: float, beta: float, move: str):
+        flag = UPPER if score <= alpha else LOWER if score >= beta else EXACT
+        key, symmetry = self.tt_key(state)
+        if symmetry:
+            move = transform_move(move, state.geometry.symmetries[symmetry].actions)
+        self.tt.store(key, depth, score, flag, move)
+
+    def search_root(self, run_root) -> (float, str):
+        # run_root(alpha, beta) searches the root, with aspiration windows a score outside
+        # the window is only a bound, so the root is searched again with the full window
+        if self.aspiration is None or self.prev_score is None:
+            score, action = run_root(-math.inf, math.inf)
+        else:
+            alpha, beta = self.prev_score - self.aspiration, self.prev_score + self.aspiration
+            score, action = run_root(alpha, beta)
+            if score <= alpha or score >= beta:
+                self.aspiration_researches += 1
+                score, action = run_root(-math.inf, math.inf)
+        self.prev_score = score
+        return score, action
+
+    def run(self, node: Node, depth: int, curr_agent_id: int, alpha: float, beta: float,
+            ply: int = 0) -> (float, Node):
+        self.tick(depth)
+        if self.is_terminal(node, curr_agent_id) or self.is_depth_limit(depth):
             return self.eval(node, curr_agent_id), node
 
+        # unlimited (negative) depth searches run to the end of the game
+        tt_depth = depth if depth > 0 else math.inf
+        tt_move = None
+        alpha_orig, beta_orig = alpha, beta
+        if self.tt is not None:
+            tt_score, tt_move, alpha, beta = self.probe_tt(node.get_state(), tt_depth, alpha, beta, ply)
+            if tt_score is not None:
+                return tt_score, None
+        # the subtree is stored as searched to the end of the game unless it hits the depth limit
+        limited, self.depth_limited = self.depth_limited, False
+
         if isinstance(node, Minimax.MaxNode):
             # MAX
             score = -math.inf
             n = None
-            for s in node.successors(curr_agent_id):
-                tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, alpha, beta)
+            # moves are ordered before any child state is copied
+            actions = self.order_moves(node.get_state(), curr_agent_id,
+                                       node.get_state().get_legal_actions(curr_agent_id), ply, tt_move)
+            successors, values = self.expand_node(node, depth, curr_agent_id, curr_agent_id, actions)
+            for i, s in enumerate(successors):
+                if values is not None:
+                    tmp = values[i]
+                elif self.pvs and i:
+                    tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, alpha, alpha + MinimaxAB.PVS_EPSILON, ply + 1)
+                    if alpha < tmp < beta:
+                        tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, alpha, beta, ply + 1)
+                else:
+                    tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, alpha, beta, ply + 1)
                 if score < tmp:
                     score = tmp
                     n = s
                 alpha = max(alpha, score)
                 if alpha >= beta:
-                    print('ab cut')
+                    self.cutoff(i)
+                    if self.ordering is not None:
+                        self.ordering.record_cutoff(node.get_state(), curr_agent_id, s.get_direction(), ply, depth)
                     break
-
-            return score, n
         else:
             # MIN
             score = math.inf
             n = None
             rival_id = node.get_rival_ids(curr_agent_id)
-            for s in node.successors(rival_id[0]):
-                tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, alpha, beta)
+            actions = self.order_moves(node.get_state(), rival_id[0], node.get_state().get_legal_actions(rival_id[0]),
+                                       ply, tt_move)
+            successors, values = self.expand_node(node, depth, rival_id[0], curr_agent_id, actions)
+            for i, s in enumerate(successors):
+                if values is not None:
+                    tmp = values[i]
+                elif self.pvs and i:
+                    tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, beta - MinimaxAB.PVS_EPSILON, beta, ply + 1)
+                    if alpha < tmp < beta:
+                        tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, alpha, beta, ply + 1)
+                else:
+                    tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, alpha, beta, ply + 1)
                 if score > tmp:
                     score = tmp
                     n = s
+                beta = min(beta, score)
+                if alpha >= beta:
+                    self.cutoff(i)
+                    if self.ordering is not None:
+                        self.ordering.record_cutoff(node.get_state(), rival_id[0], s.get_direction(), ply, depth)
+                    break
+
+        if self.tt is not None:
+            self.store_tt(node.get_state(), tt_depth if self.depth_limited else math.inf, score, alpha_orig, beta_orig,
+                          n.get_direction())
+        self.depth_limited = self.depth_limited or limited
+        return score, n
+
+    def search(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        def run_root(alpha, beta):
+            score, node = self.run(self.MaxNode(state), depth, curr_agent_id, alpha, beta)
+            return score, node.get_direction()
+        return self.search_root(run_root)
+
+    def search_in_place(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        state = state.copy()
+        return self.search_root(lambda alpha, beta: self.run_in_place(state, depth, curr_agent_id, alpha, beta))
+
+    def search_move(self, state: GameState, depth: int, curr_agent_id: int, action: str,
+                    alpha: float = -math.inf) -> float:
+        state = state.copy()
+        state.do_action(curr_agent_id, action)
+        return self.run_in_place(state, depth - 1, curr_agent_id, alpha, math.inf, False, 1)[0]
+
+    def run_in_place(self, state: GameState, depth: int, curr_agent_id: int, alpha: float = -math.inf,
+                     beta: float = math.inf, maximizing: bool = True, ply: int = 0) -> (float, str):
+        self.tick(depth)
+        if is_terminal_state(state) or self.is_depth_limit(depth):
+            return self.eval_state(state, curr_agent_id), None
+
+        tt_depth = depth if depth > 0 else math.inf
+        tt_move = None
+        alpha_orig, beta_orig = alpha, beta
+        if self.tt is not None:
+            tt_score, tt_move, alpha, beta = self.probe_tt(state, tt_depth, alpha, beta, ply)
+            if tt_score is not None:
+                return tt_score, tt_move
+        # the subtree is stored as searched to the end of the game unless it hits the depth limit
+        limited, self.depth_limited = self.depth_limited, False
+
+        if maximizing:
+            # MAX
+            score = -math.inf
+            action = None
+            actions = self.order_moves(state, curr_agent_id, state.get_legal_actions(curr_agent_id), ply, tt_move)
+            values = self.leaf_values(state, depth, curr_agent_id, actions, curr_agent_id)
+            for i, act in enumerate(actions):
+                if values is not None:
+                    tmp = values[act]
+                else:
+                    state.do_action(curr_agent_id, act)
+                    if self.pvs and i:
+                        tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, alpha,
+                                                   alpha + MinimaxAB.PVS_EPSILON, False, ply + 1)
+                        if alpha < tmp < beta:
+                            tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, alpha, beta, False, ply + 1)
+                    else:
+                        tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, alpha, beta, False, ply + 1)
+                    state.undo()
+                if score < tmp:
+                    score = tmp
+                    action = act
                 alpha = max(alpha, score)
                 if alpha >= beta:
-                    print('ab cut')
+                    self.cutoff(i)
+                    if self.ordering is not None:
+                        self.ordering.record_cutoff(state, curr_agent_id, act, ply, depth)
+                    break
+        else:
+            # MIN
+            score = math.inf
+            action = None
+            rival_id = get_rival_ids(state, curr_agent_id)
+            actions = self.order_moves(state, rival_id[0], state.get_legal_actions(rival_id[0]), ply, tt_move)
+            values = self.leaf_values(state, depth, rival_id[0], actions, curr_agent_id)
+            for i, act in enumerate(actions):
+                if values is not None:
+                    tmp = values[act]
+                else:
+                    state.do_action(rival_id[0], act)
+                    if self.pvs and i:
+                        tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, beta - MinimaxAB.PVS_EPSILON,
+                                                   beta, True, ply + 1)
+                        if alpha < tmp < beta:
+                            tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, alpha, beta, True, ply + 1)
+                    else:
+                        tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, alpha, beta, True, ply + 1)
+                    state.undo()
+                if score > tmp:
+                    score = tmp
+                    action = act
+                beta = min(beta, score)
+                if alpha >= beta:
+                    self.cutoff(i)
+                    if self.ordering is not None:
+                        self.ordering.record_cutoff(state, rival_id[0], act, ply, depth)
                     break
 
-            return score, n
+        if self.tt is not None:
+            self.store_tt(state, tt_depth if self.depth_limited else math.inf, score, alpha_orig, beta_orig, action)
+        self.depth_limited = self.depth_limited or limited
+        return score, action
 
 
 class Expectimax(Minimax):
     class MaxNode(Node):
-        def successors(self, agent_id: int) -> list:
-            actions = self.state.get_legal_actions(agent_id)
-            states_list = [self.state.apply_action(agent_id, act) for act in actions]
-            successors = [Expectimax.ChanceNode(states_list[i], actions[i]) for i in range(len(states_list))]
-            return successors
+        def child(self, state: GameState, action: str, agent_id: int) -> Node:
+            return Expectimax.ChanceNode(state, action)
 
     class ChanceNode(Node):
-        def successors(self, agent_id: int) -> list:
-            actions = self.state.get_legal_actions(agent_id)
-            states_list = [self.state.apply_action(agent_id, act) for act in actions]
-            successors = [Expectimax.MaxNode(states_list[i], actions[i]) for i in range(len(states_list))]
-            return successors
+        def child(self, state: GameState, action: str, agent_id: int) -> Node:
+            return Expectimax.MaxNode(state, action)
 
     def run(self, node: Node, depth: int, curr_agent_id: int) -> (float, Node):
-        if self.is_terminal(node, curr_agent_id) or depth == 0:
+        self.tick(depth)
+        if self.is_terminal(node, curr_agent_id) or self.is_depth_limit(depth):
             return self.eval(node, curr_agent_id), node
 
         if isinstance(node, Expectimax.MaxNode):
             # MAX
             score = -math.inf
             n = None
-            for s in node.successors(curr_agent_id):
-                tmp, n_tmp = self.run(s, depth - 1, curr_agent_id)
+            successors, values = self.expand_node(node, depth, curr_agent_id, curr_agent_id)
+            for i, s in enumerate(successors):
+                if values is not None:
+                    tmp = values[i]
+                else:
+                    tmp, n_tmp = self.run(s, depth - 1, curr_agent_id)
                 if score < tmp:
                     score = tmp
                     n = s
@@ -160,47 +553,233 @@ class Expectimax(Minimax):
             score = 0
             n = None
             rival_id = node.get_rival_ids(curr_agent_id)
-            successors = node.successors(rival_id[0])
-            for s in successors:
-                prob = 1 / len(successors)
-                tmp, n_tpm = self.run(s, depth - 1, curr_agent_id)
+            actions = node.get_state().get_legal_actions(rival_id[0])
+            successors, values = self.expand_node(node, depth, rival_id[0], curr_agent_id, actions)
+            for i, s in enumerate(successors):
+                prob = 1 / len(actions)
+                if values is not None:
+                    tmp = values[i]
+                else:
+                    tmp, n_tpm = self.run(s, depth - 1, curr_agent_id)
                 score += prob * tmp
                 n = node
 
             return score, n
 
+    def run_in_place(self, state: GameState, depth: int, curr_agent_id: int, maximizing: bool = True) -> (float, str):
+        self.tick(depth)
+        if is_terminal_state(state) or self.is_depth_limit(depth):
+            return self.eval_state(state, curr_agent_id), None
+
+        if maximizing:
+            # MAX
+            score = -math.inf
+            action = None
+            actions = state.get_legal_actions(curr_agent_id)
+            values = self.leaf_values(state, depth, curr_agent_id, actions, curr_agent_id)
+            for act in actions:
+                if values is not None:
+                    tmp = values[act]
+                else:
+                    state.do_action(curr_agent_id, act)
+                    tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, False)
+                    state.undo()
+                if score < tmp:
+                    score = tmp
+                    action = act
+
+            return score, action
+        else:
+            # CHANCE
+            score = 0
+            rival_id = get_rival_ids(state, curr_agent_id)
+            actions = state.get_legal_actions(rival_id[0])
+            values = self.leaf_values(state, depth, rival_id[0], actions, curr_agent_id)
+            for act in actions:
+                prob = 1 / len(actions)
+                if values is not None:
+                    tmp = values[act]
+                else:
+                    state.do_action(rival_id[0], act)
+                    tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, True)
+                    state.undo()
+                score += prob * tmp
+
+            return score, None
+
+
+def chase_action(state: GameState, agent_id: int, actions: list, target_id: int) -> str:
+    # the move bots.Aki plays: the first one that gets closest to the target agent
+    agent_pos = state.agents[agent_id].position()
+    target = state.agents[target_id].position()
+    return min(actions, key=lambda act: manhattan((agent_pos[0] + Action.actions[act][0],
+                                                   agent_pos[1] + Action.actions[act][1]), target))
+
+
+def uniform_model(state: GameState, agent_id: int, actions: list, target_id: int, weight: float) -> list:
+    return [1 / len(actions)] * len(actions)
+
+
+def chase_model(state: GameState, agent_id: int, actions: list, target_id: int, weight: float) -> list:
+    # weight of the probability goes to the chase move, the rest is spread uniformly over all the moves
+    chase = chase_action(state, agent_id, actions, target_id)
+    rest = (1 - weight) / len(actions)
+    return [rest + weight if act == chase else rest for act in actions]
+
+
+# probabilities of the rival moves in a chance node
+OPPONENT_MODELS = {'uniform': uniform_model, 'chase': chase_model}
+
+
+class StarExpectimax(Expectimax):
+    # Expectimax with Star1/Star2 pruning (Ballard; Hauk, Buro & Schaeffer). Every eval lies in the evaluator
+    # bounds, so once some children of a chance node are searched the unsearched ones can only move its value within
+    # known bounds, and the node is cut off as soon as that range leaves the (alpha, beta) window. Star2 first
+    # probes one move of every child MAX node for lower bounds, which tighten the windows or cut off the node.
+    # Moves are searched in descending probability, the pruning holds for any opponent model.
+
+    def __init__(self, star: int = 1, model: str = 'uniform', chase_weight: float = config.EXPECTIMAX_CHASE_WEIGHT):
+        if model not in OPPONENT_MODELS:
+            raise Exception(f'ERR: {model} is not an opponent model! '
+                            f'Opponent models are ({", ".join(OPPONENT_MODELS.keys())})')
+        self.star = star
+        self.model = model
+        self.chase_weight = chase_weight
+        # bounds of every eval of the evaluator, set by each search
+        self.low = self.high = None
+
+    def search(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        return self.search_in_place(state, depth, curr_agent_id)
+
+    def search_in_place(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        self.low, self.high = self.evaluator.bounds(state)
+        return self.run_in_place(state.copy(), depth, curr_agent_id, self.low, self.high)
+
+    def search_move(self, state: GameState, depth: int, curr_agent_id: int, action: str,
+                    alpha: float = -math.inf) -> float:
+        self.low, self.high = self.evaluator.bounds(state)
+        state = state.copy()
+        state.do_action(curr_agent_id, action)
+        return self.run_in_place(state, depth - 1, curr_agent_id, max(self.low, alpha), self.high, False)[0]
+
+    def chance_moves(self, state: GameState, agent_id: int, curr_agent_id: int) -> list:
+        # (probability, action), most probable first
+        actions = state.get_legal_actions(agent_id)
+        probs = OPPONENT_MODELS[self.model](state, agent_id, actions, curr_agent_id, self.chase_weight)
+        return sorted(((prob, act) for prob, act in zip(probs, actions) if prob > 0), key=lambda move: -move[0])
+
+    def run_in_place(self, state: GameState, depth: int, curr_agent_id: int, alpha: float, beta: float,
+                     maximizing: bool = True, first: float = None) -> (float, str):
+        # first - value of the first MAX move when a Star2 probe already searched it
+        self.tick(depth)
+        if is_terminal_state(state) or self.is_depth_limit(depth):
+            return self.eval_state(state, curr_agent_id), None
+
+        if maximizing:
+            # MAX
+            actions = state.get_legal_actions(curr_agent_id)
+            score = -math.inf if first is None else first
+            action = None if first is None else actions[0]
+            if score >= beta:
+                return score, action
+            for i, act in enumerate(actions[0 if first is None else 1:], 0 if first is None else 1):
+                state.do_action(curr_agent_id, act)
+                tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, max(alpha, score), beta, False)
+                state.undo()
+                if score < tmp:
+                    score = tmp
+                    action = act
+                if score >= beta:
+                    self.cutoff(i)
+                    break
+            return score, action
+        else:
+            # CHANCE
+            rival_id = get_rival_ids(state, curr_agent_id)[0]
+            return self.chance(state, depth, curr_agent_id, rival_id, alpha, beta), None
+
+    def chance(self, state: GameState, depth: int, curr_agent_id: int, rival_id: int, alpha: float,
+               beta: float) -> float:
+        low, high = self.low, self.high
+        moves = self.chance_moves(state, rival_id, curr_agent_id)
+        # lower bounds of the children values, exact values of their first moves if Star2 probed them
+        lower = [low] * len(moves)
+        probes = [None] * len(moves)
+        if self.star > 1:
+            # Star2 probing phase
+            probed = 0.0
+            left = 1.0
+            for i, (prob, act) in enumerate(moves):
+                left -= prob
+                child_beta = (beta - probed - left * low) / prob
+                state.do_action(rival_id, act)
+                bound = self.probe(state, depth - 1, curr_agent_id, min(high, child_beta))
+                state.undo()
+                if bound is None:
+                    # a leaf, evaluated in the Star1 phase
+                    probed += prob * low
+                    continue
+                if bound >= child_beta:
+                    self.cutoff(i)
+                    return probed + prob * bound + left * low
+                lower[i] = probes[i] = bound
+                probed += prob * bound
+        # Star1 search phase
+        searched = 0.0
+        left = 1.0
+        rest_lower = sum(prob * bound for (prob, _), bound in zip(moves, lower))
+        for i, (prob, act) in enumerate(moves):
+            left -= prob
+            rest_lower -= prob * lower[i]
+            child_alpha = (alpha - searched - left * high) / prob
+            child_beta = (beta - searched - rest_lower) / prob
+            state.do_action(rival_id, act)
+            tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, max(low, child_alpha), min(high, child_beta),
+                                       True, probes[i])
+            state.undo()
+            if tmp <= child_alpha:
+                self.cutoff(i)
+                return searched + prob * tmp + left * high
+            if tmp >= child_beta:
+                self.cutoff(i)
+                return searched + prob * tmp + rest_lower
+            searched += prob * tmp
+        return searched
+
+    def probe(self, state: GameState, depth: int, curr_agent_id: int, beta: float) -> float:
+        # lower bound of a MAX node: the value of its first move only, exact unless it is at least beta
+        if is_terminal_state(state) or self.is_depth_limit(depth):
+            return None
+        state.do_action(curr_agent_id, state.get_legal_actions(curr_agent_id)[0])
+        bound, _ = self.run_in_place(state, depth - 1, curr_agent_id, self.low, beta, False)
+        state.undo()
+        return bound
+
 
 class MinimaxN(Minimax):
     class MaxNode(Node):
-        def successors(self, agent_id: int) -> list:
-            actions = self.state.get_legal_actions(agent_id)
-            states_list = [self.state.apply_action(agent_id, act) for act in actions]
-            successors = [MinimaxN.MinNode(states_list[i], actions[i]) for i in range(len(states_list))]
-            return successors
+        def child(self, state: GameState, action: str, agent_id: int) -> Node:
+            return MinimaxN.MinNode(state, action)
 
     class MinNode(Node):
-        def successors(self, agent_id: int) -> list:
-            actions = self.state.get_legal_actions(agent_id)
-            states_list = [self.state.apply_action(agent_id, act) for act in actions]
-            successors = None
+        def child(self, state: GameState, action: str, agent_id: int) -> Node:
             if self.is_last_player(agent_id):
-                successors = [MinimaxN.MaxNode(states_list[i], actions[i]) for i in range(len(states_list))]
-            else:
-                successors = [MinimaxN.MinNode(states_list[i], actions[i]) for i in range(len(states_list))]
-            return successors
+                return MinimaxN.MaxNode(state, action)
+            return MinimaxN.MinNode(state, action)
 
         def is_last_player(self, agent_id: int) -> bool:
             return True if agent_id == len(self.state.agents) - 1 else False
 
     def run(self, node: Node, depth: int, curr_agent_id: int, next_agent_id: int) -> (float, Node):
-        if self.is_terminal(node, curr_agent_id) or depth == 0:
+        self.tick(depth)
+        if self.is_terminal(node, curr_agent_id) or self.is_depth_limit(depth):
             return self.eval(node, curr_agent_id), node
 
         if isinstance(node, MinimaxN.MaxNode):
             # MAX
             score = -math.inf
             n = None
-            for s in node.successors(curr_agent_id):
+            for s in node.expand(curr_agent_id):
                 tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, (curr_agent_id + 1) % len(node.get_state().agents))
                 if score < tmp:
                     score = tmp
@@ -215,7 +794,7 @@ class MinimaxN(Minimax):
             while next_agent_id not in rivals:
                 next_agent_id = (next_agent_id + 1) % len(node.get_state().agents)
 
-            for s in node.successors(next_agent_id):
+            for s in node.expand(next_agent_id):
                 tmp, n_tmp = self.run(s, depth - 1, curr_agent_id, (next_agent_id + 1) % len(node.get_state().agents))
                 if score > tmp:
                     score = tmp
@@ -223,6 +802,324 @@ class MinimaxN(Minimax):
 
             return score, n
 
+    def search(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        score, node = self.run(self.MaxNode(state), depth, curr_agent_id, curr_agent_id)
+        return score, node.get_direction()
+
+    def search_move(self, state: GameState, depth: int, curr_agent_id: int, action: str,
+                    alpha: float = -math.inf) -> float:
+        state = state.copy()
+        state.do_action(curr_agent_id, action)
+        return self.run_in_place(state, depth - 1, curr_agent_id, (curr_agent_id + 1) % len(state.agents), False)[0]
+
+    def run_in_place(self, state: GameState, depth: int, curr_agent_id: int, next_agent_id: int = None,
+                     maximizing: bool = True) -> (float, str):
+        self.tick(depth)
+        if is_terminal_state(state) or self.is_depth_limit(depth):
+            return self.eval_state(state, curr_agent_id), None
+
+        agents_num = len(state.agents)
+        if maximizing:
+            # MAX
+            score = -math.inf
+            action = None
+            for act in state.get_legal_actions(curr_agent_id):
+                state.do_action(curr_agent_id, act)
+                tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, (curr_agent_id + 1) % agents_num, False)
+                state.undo()
+                if score < tmp:
+                    score = tmp
+                    action = act
+
+            return score, action
+        else:
+            # MIN
+            score = math.inf
+            action = None
+            rivals = get_rival_ids(state, curr_agent_id)
+            while next_agent_id not in rivals:
+                next_agent_id = (next_agent_id + 1) % agents_num
+
+            # same turn order as MinimaxN.MinNode.successors
+            is_last_player = next_agent_id == agents_num - 1
+            for act in state.get_legal_actions(next_agent_id):
+                state.do_action(next_agent_id, act)
+                tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, (next_agent_id + 1) % agents_num,
+                                           is_last_player)
+                state.undo()
+                if score > tmp:
+                    score = tmp
+                    action = act
+
+            return score, action
+
+
+class Paranoid(MinimaxAB):
+    # Every rival minimizes the score of curr_agent_id, the agents move one at a time in the game turn order,
+    # so the N player game is searched as a two player one with alpha-beta.
+
+    def search(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        return self.search_in_place(state, depth, curr_agent_id)
+
+    def search_in_place(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        state = state.copy()
+        return self.search_root(lambda alpha, beta: self.run_in_place(state, depth, curr_agent_id, alpha, beta))
+
+    def search_move(self, state: GameState, depth: int, curr_agent_id: int, action: str,
+                    alpha: float = -math.inf) -> float:
+        state = state.copy()
+        state.do_action(curr_agent_id, action)
+        return self.run_in_place(state, depth - 1, curr_agent_id, alpha, math.inf,
+                                 next_agent_id(state, curr_agent_id), 1)[0]
+
+    def run_in_place(self, state: GameState, depth: int, curr_agent_id: int, alpha: float = -math.inf,
+                     beta: float = math.inf, agent_id: int = None, ply: int = 0) -> (float, str):
+        self.tick(depth)
+        if is_terminal_state(state) or self.is_depth_limit(depth):
+            return self.eval_state(state, curr_agent_id), None
+
+        if agent_id is None:
+            agent_id = curr_agent_id
+        tt_depth = depth if depth > 0 else math.inf
+        tt_move = None
+        alpha_orig, beta_orig = alpha, beta
+        if self.tt is not None:
+            tt_score, tt_move, alpha, beta = self.probe_tt(state, tt_depth, alpha, beta, ply)
+            if tt_score is not None:
+                return tt_score, tt_move
+        # the subtree is stored as searched to the end of the game unless it hits the depth limit
+        limited, self.depth_limited = self.depth_limited, False
+
+        maximizing = agent_id == curr_agent_id
+        next_id = next_agent_id(state, agent_id)
+        score = -math.inf if maximizing else math.inf
+        action = None
+        actions = self.order_moves(state, agent_id, state.get_legal_actions(agent_id), ply, tt_move)
+        for i, act in enumerate(actions):
+            state.do_action(agent_id, act)
+            tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, alpha, beta, next_id, ply + 1)
+            state.undo()
+            if maximizing:
+                # MAX
+                if score < tmp:
+                    score = tmp
+                    action = act
+                alpha = max(alpha, score)
+            else:
+                # MIN
+                if score > tmp:
+                    score = tmp
+                    action = act
+                beta = min(beta, score)
+            if alpha >= beta:
+                self.cutoff(i)
+                if self.ordering is not None:
+                    self.ordering.record_cutoff(state, agent_id, act, ply, depth)
+                break
+
+        if self.tt is not None:
+            self.store_tt(state, tt_depth if self.depth_limited else math.inf, score, alpha_orig, beta_orig, action)
+        self.depth_limited = self.depth_limited or limited
+        return score, action
+
+
+class BestReplySearch(MinimaxAB):
+    # Best-Reply Search (Schadd & Winands): a MIN layer holds the moves of all the rivals, only the rival with
+    # the strongest reply moves and the others pass, so MAX gets a move on every other ply.
+
+    def search(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        return self.search_in_place(state, depth, curr_agent_id)
+
+    def search_in_place(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        state = state.copy()
+        return self.search_root(lambda alpha, beta: self.run_in_place(state, depth, curr_agent_id, alpha, beta))
+
+    def search_move(self, state: GameState, depth: int, curr_agent_id: int, action: str,
+                    alpha: float = -math.inf) -> float:
+        state = state.copy()
+        state.do_action(curr_agent_id, action)
+        return self.run_in_place(state, depth - 1, curr_agent_id, alpha, math.inf, False, 1)[0]
+
+    def run_in_place(self, state: GameState, depth: int, curr_agent_id: int, alpha: float = -math.inf,
+                     beta: float = math.inf, maximizing: bool = True, ply: int = 0) -> (float, str):
+        self.tick(depth)
+        if is_terminal_state(state) or self.is_depth_limit(depth):
+            return self.eval_state(state, curr_agent_id), None
+
+        tt_depth = depth if depth > 0 else math.inf
+        tt_move = None
+        alpha_orig, beta_orig = alpha, beta
+        if self.tt is not None:
+            tt_score, tt_move, alpha, beta = self.probe_tt(state, tt_depth, alpha, beta, ply)
+            if tt_score is not None:
+                return tt_score, tt_move if maximizing else None
+        # the subtree is stored as searched to the end of the game unless it hits the depth limit
+        limited, self.depth_limited = self.depth_limited, False
+
+        if maximizing:
+            # MAX
+            score = -math.inf
+            action = None
+            actions = self.order_moves(state, curr_agent_id, state.get_legal_actions(curr_agent_id), ply, tt_move)
+            for i, act in enumerate(actions):
+                state.do_action(curr_agent_id, act)
+                tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, alpha, beta, False, ply + 1)
+                state.undo()
+                if score < tmp:
+                    score = tmp
+                    action = act
+                alpha = max(alpha, score)
+                if alpha >= beta:
+                    self.cutoff(i)
+                    if self.ordering is not None:
+                        self.ordering.record_cutoff(state, curr_agent_id, act, ply, depth)
+                    break
+        else:
+            # MIN over the replies of all the rivals, moves are (rival_id, action)
+            score = math.inf
+            action = None
+            moves = tt_move_first([(rival_id, act) for rival_id in get_rival_ids(state, curr_agent_id)
+                                   for act in state.get_legal_actions(rival_id)], tt_move)
+            for i, (rival_id, act) in enumerate(moves):
+                state.do_action(rival_id, act)
+                tmp, _ = self.run_in_place(state, depth - 1, curr_agent_id, alpha, beta, True, ply + 1)
+                state.undo()
+                if score > tmp:
+                    score = tmp
+                    action = (rival_id, act)
+                beta = min(beta, score)
+                if alpha >= beta:
+                    self.cutoff(i)
+                    break
+
+        if self.tt is not None:
+            self.store_tt(state, tt_depth if self.depth_limited else math.inf, score, alpha_orig, beta_orig, action)
+        self.depth_limited = self.depth_limited or limited
+        return score, action
+
+
+class MaxN(Minimax):
+    # max^n with shallow pruning (Korf): every agent maximizes its own entry of a score vector. The entries
+    # are shares of the total mobility, non-negative and summing up to MAX_SUM, so once the agent to move
+    # gets MAX_SUM - (what its parent agent already has) the parent can not prefer this node any more.
+    MAX_SUM = 100
+
+    @staticmethod
+    def eval_vector(state: GameState) -> list:
+        mobility = [len(state.get_legal_actions(agent_id)) for agent_id in range(len(state.agents))]
+        total = sum(mobility)
+        if not total:
+            # nobody can move, the agent that played last wins (GameState.adjust_win_loss)
+            return [MaxN.MAX_SUM if agent_id == state.last_agent_played_id else 0 for agent_id in range(len(mobility))]
+        return [MaxN.MAX_SUM * m / total for m in mobility]
+
+    @staticmethod
+    def eval_state(state: GameState, agent_id: int) -> float:
+        return MaxN.eval_vector(state)[agent_id]
+
+    def search(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        return self.search_in_place(state, depth, curr_agent_id)
+
+    def search_in_place(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        scores, action = self.run_in_place(state.copy(), depth, curr_agent_id)
+        return scores[curr_agent_id], action
+
+    def search_move(self, state: GameState, depth: int, curr_agent_id: int, action: str,
+                    alpha: float = -math.inf) -> float:
+        state = state.copy()
+        state.do_action(curr_agent_id, action)
+        return self.run_in_place(state, depth - 1, next_agent_id(state, curr_agent_id))[0][curr_agent_id]
+
+    def run_in_place(self, state: GameState, depth: int, agent_id: int, bound: float = 0) -> (list, str):
+        # bound - score of the parent agent's best move so far
+        self.tick(depth)
+        if is_terminal_state(state) or self.is_depth_limit(depth):
+            return self.eval_vector(state), None
+
+        next_id = next_agent_id(state, agent_id)
+        scores = None
+        action = None
+        for i, act in enumerate(state.get_legal_actions(agent_id)):
+            state.do_action(agent_id, act)
+            tmp, _ = self.run_in_place(state, depth - 1, next_id, scores[agent_id] if scores is not None else 0)
+            state.undo()
+            if scores is None or scores[agent_id] < tmp[agent_id]:
+                scores = tmp
+                action = act
+            if scores[agent_id] >= MaxN.MAX_SUM - bound:
+                self.cutoff(i)
+                break
+
+        return scores, action
+
+
+# selectable searches of MaxNAgent and the Bole bot
+MULTI_AGENT_MODES = {'minimaxn': MinimaxN, 'paranoid': Paranoid, 'brs': BestReplySearch, 'maxn': MaxN}
+
+
+class IterativeDeepening:
+    # Searches depth 1, 2, 3... and keeps the result of the last completed iteration. The next iteration
+    # only starts if its time, predicted from the growth of the previous ones, fits in the think time budget,
+    # an iteration still running when the deadline expires is abandoned.
+    DEFAULT_GROWTH = 4
+
+    def __init__(self, alg: Minimax, time_limit: float, in_place: bool = False,
+                 time_fraction: float = config.ID_TIME_FRACTION, deadline: Deadline = None):
+        self.alg = alg
+        self.time_limit = time_limit
+        self.in_place = in_place
+        self.time_fraction = time_fraction
+        self.deadline = deadline if deadline is not None else Deadline(time_limit * config.DEADLINE_FRACTION)
+        self.depth = 0
+        # set when the last completed iteration searched the whole game tree
+        self.complete = False
+
+    def search(self, state: GameState, max_depth: int, curr_agent_id: int, resume=None) -> (float, str):
+        # resume - (depth, result, complete) of an earlier search of the same position (ponder.Pondered),
+        # deepening goes on from the iteration after it
+        start_time = time.perf_counter()
+        budget = self.time_limit * self.time_fraction
+        self.alg.start_search()
+        self.alg.deadline = self.deadline
+        # a legal move to play even if the first iteration does not finish in time
+        actions = state.get_legal_actions(curr_agent_id)
+        result = (self.alg.eval_state(state, curr_agent_id), actions[0] if actions else None)
+        prev_elapsed = None
+        depth = 1
+        if resume is not None:
+            result = resume.result
+            self.depth = resume.depth
+            self.complete = resume.complete
+            depth = resume.depth + 1
+            if self.complete:
+                return result
+        while max_depth < 0 or depth <= max_depth:
+            iter_start = time.perf_counter()
+            self.alg.depth_limited = False
+            try:
+                result = self.run_iteration(state, depth, curr_agent_id)
+            except Timeout:
+                break
+            self.depth = depth
+            self.complete = not self.alg.depth_limited
+            now = time.perf_counter()
+            elapsed = now - iter_start
+            if self.complete:
+                # the whole game tree fits in this depth, deeper iterations give the same answer
+                break
+            growth = elapsed / prev_elapsed if prev_elapsed else IterativeDeepening.DEFAULT_GROWTH
+            growth = max(growth, 1)
+            if now - start_time + elapsed * growth > budget:
+                break
+            prev_elapsed = elapsed
+            depth += 1
+        return result
+
+    def run_iteration(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        if self.in_place:
+            return self.alg.search_in_place(state, depth, curr_agent_id)
+        return self.alg.search(state, depth, curr_agent_id)
+
 
 def print_map(state: GameState):
     print('---------------')
@@ -0,0 +1,54 @@
+class MoveOrdering:
+    # Orders the moves of MaxNode/MinNode expansion: the transposition table (or previous iteration) move first,
+    # then the killer moves of the ply, then by the history heuristic and optionally by the mobility the
+    # move leaves to the moving agent.
+    KILLERS_PER_PLY = 2
+
+    def __init__(self, killers=True, history=True, mobility=False):
+        self.use_killers = killers
+        self.use_history = history
+        self.use_mobility = mobility
+        # ply -> most recent cutoff moves
+        self.killers = dict()
+        # (agent_id, from_position, action) -> accumulated cutoff bonus
+        self.history = dict()
+
+    def new_search(self):
+        # killers are relative to the root, history carries over to the next move with halved weight
+        self.killers.clear()
+        self.history = {k: v // 2 for k, v in self.history.items() if v > 1}
+
+    def order(self, state, agent_id, moves, ply, tt_move=None, key=None):
+        # moves are action names, or anything key maps to an action name (e.g. Node.get_direction)
+        if len(moves) < 2:
+            return moves
+        killers = self.killers.get(ply, ()) if self.use_killers else ()
+        from_pos = state.agents[agent_id].position() if self.use_history else None
+        scores = dict()
+        for move in moves:
+            action = key(move) if key is not None else move
+            score = (action == tt_move,
+                     action in killers,
+                     self.history.get((agent_id, from_pos, action), 0) if self.use_history else 0,
+                     self.mobility(state, agent_id, action) if self.use_mobility else 0)
+            scores[action] = score
+        if key is None:
+            return sorted(moves, key=lambda m: scores[m], reverse=True)
+        return sorted(moves, key=lambda m: scores[key(m)], reverse=True)
+
+    @staticmethod
+    def mobility(state, agent_id, action):
+        state.do_action(agent_id, action)
+        mobility = len(state.get_legal_actions(agent_id))
+        state.undo()
+        return mobility
+
+    def record_cutoff(self, state, agent_id, action, ply, depth):
+        if self.use_killers:
+            killers = self.killers.setdefault(ply, [])
+            if action not in killers:
+                killers.insert(0, action)
+                del killers[MoveOrdering.KILLERS_PER_PLY:]
+        if self.use_history:
+            history_key = (agent_id, state.agents[agent_id].position(), action)
+            self.history[history_key] = self.history.get(history_key, 0) + (depth * depth if depth > 0 else 1)
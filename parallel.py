@@ -0,0 +1,204 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import config
+
+from evaluators import EVALUATORS
+from minimax import Minimax, MinimaxAB, Expectimax, StarExpectimax, MinimaxN, Paranoid, BestReplySearch, MaxN, \
+    IterativeDeepening
+from ordering import MoveOrdering
+from states import GameState
+from stats import SearchStats
+from transposition import TranspositionTable
+from util import Deadline, Timeout
+
+ALGORITHMS = {alg.__name__: alg for alg in (Minimax, MinimaxAB, Expectimax, StarExpectimax, MinimaxN, Paranoid,
+                                           BestReplySearch, MaxN)}
+
+# per worker process: algorithm spec -> algorithm, so MinimaxAB tables stay warm from move to move
+worker_algorithms = dict()
+# per worker process: shared value holding the id of the last search the parent cancelled (SearchPool.cancel)
+cancelled_search = None
+
+
+def algorithm_spec(alg: Minimax) -> tuple:
+    # picklable description of a search algorithm and its leaf evaluation, the transposition table and move ordering
+    # of MinimaxAB are not sent, every worker keeps its own
+    if isinstance(alg, MinimaxAB):
+        args = alg.tt is not None, alg.ordering is not None, alg.pvs, alg.aspiration
+    elif isinstance(alg, StarExpectimax):
+        args = alg.star, alg.model, alg.chase_weight
+    else:
+        args = ()
+    return (type(alg).__name__, alg.evaluator.name, alg.batch_eval) + args
+
+
+def worker_algorithm(spec: tuple) -> Minimax:
+    alg = worker_algorithms.get(spec)
+    if alg is None:
+        class_ = ALGORITHMS[spec[0]]
+        if issubclass(class_, MinimaxAB):
+            tt, ordering, pvs, aspiration = spec[3:]
+            alg = class_(TranspositionTable() if tt else None, MoveOrdering() if ordering else None, pvs, aspiration)
+        else:
+            alg = class_(*spec[3:])
+        alg.evaluator = EVALUATORS[spec[1]]
+        alg.batch_eval = spec[2]
+        worker_algorithms[spec] = alg
+    return alg
+
+
+def init_worker(cancelled):
+    global cancelled_search
+    cancelled_search = cancelled
+
+
+def warm_up() -> int:
+    return os.getpid()
+
+
+class PoolDeadline(Deadline):
+    # Deadline of a worker search, it also expires once the parent cancels the search, so a worker whose
+    # result is not waited for any more stops instead of running into the next move
+    def __init__(self, seconds: float, search_id: int):
+        super().__init__(seconds)
+        self.search_id = search_id
+
+    def expired(self):
+        return super().expired() or cancelled_search is not None and cancelled_search.value >= self.search_id
+
+
+def search_move(spec: tuple, state: GameState, depth: int, curr_agent_id: int, action: str, seconds: float,
+                search_id: int, alpha: float, collect_stats: bool = False):
+    # runs in a worker process, returns (score, nodes, depth_limited, stats.SearchStats record or None) or raises
+    # util.Timeout
+    alg = worker_algorithm(spec)
+    alg.start_search()
+    alg.nodes = 0
+    alg.depth_limited = False
+    alg.deadline = PoolDeadline(seconds, search_id)
+    stats = None
+    if collect_stats:
+        stats = SearchStats()
+        stats.attach(alg)
+        state = stats.instrument_state(state)
+    try:
+        score = alg.search_move(state, depth, curr_agent_id, action, alpha)
+    finally:
+        if stats is not None:
+            stats.detach()
+    return score, alg.nodes, alg.depth_limited, stats.to_dict() if stats is not None else None
+
+
+class SearchPool:
+    # Process pool shared by all parallel searches. It is started (and its workers import the search modules)
+    # once, later moves reuse the same warm processes.
+    pool = None
+    workers = 0
+    # id of the last search started and the shared id of the last one cancelled
+    searches = 0
+    cancelled = None
+
+    @staticmethod
+    def get(workers: int) -> ProcessPoolExecutor:
+        if SearchPool.pool is None or SearchPool.workers != workers:
+            if SearchPool.pool is not None:
+                SearchPool.pool.shutdown(wait=False, cancel_futures=True)
+            context = multiprocessing.get_context(config.SEARCH_START_METHOD)
+            SearchPool.cancelled = context.Value('q', SearchPool.searches, lock=False)
+            SearchPool.pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                                                  initargs=(SearchPool.cancelled,))
+            SearchPool.workers = workers
+            wait([SearchPool.pool.submit(warm_up) for _ in range(workers)])
+        return SearchPool.pool
+
+    @staticmethod
+    def new_search() -> int:
+        SearchPool.searches += 1
+        return SearchPool.searches
+
+    @staticmethod
+    def cancel(search_id: int):
+        # the worker searches of search_id and of all the searches before it stop at their next deadline check
+        if SearchPool.cancelled is not None:
+            SearchPool.cancelled.value = search_id
+
+    @staticmethod
+    def shutdown():
+        if SearchPool.pool is not None:
+            SearchPool.pool.shutdown(wait=False, cancel_futures=True)
+            SearchPool.pool = None
+            SearchPool.workers = 0
+
+
+class ParallelSearch:
+    # Root splitting: the first root move is searched on the calling process with the agent's own tables, the
+    # others by the worker processes with its score as alpha, so the pruning searches only have to prove that
+    # a move is better (a score not above alpha is a bound and loses). The best move is chosen as MAX does in
+    # Minimax.run.
+    def __init__(self, alg: Minimax, workers: int = config.SEARCH_WORKERS):
+        self.alg = alg
+        self.spec = algorithm_spec(alg)
+        self.pool = SearchPool.get(workers)
+        # best move of the last search, searched first by the next one (the next iterative deepening iteration)
+        self.best_action = None
+
+    def first_move(self, state: GameState, curr_agent_id: int, actions: list) -> str:
+        if self.best_action in actions:
+            return self.best_action
+        if isinstance(self.alg, MinimaxAB):
+            return self.alg.order_moves(state, curr_agent_id, actions, 0, None)[0]
+        return actions[0]
+
+    def search(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        actions = state.get_legal_actions(curr_agent_id)
+        if not actions:
+            return self.alg.eval_state(state, curr_agent_id), None
+        self.alg.nodes += 1
+        stats = self.alg.stats
+        if stats is not None:
+            stats.nodes_per_ply[0] = stats.nodes_per_ply.get(0, 0) + 1
+        action = self.first_move(state, curr_agent_id, actions)
+        # raises util.Timeout at the deadline of the algorithm
+        score = self.alg.search_move(state, depth, curr_agent_id, action)
+        rest = [act for act in actions if act != action]
+        deadline = self.alg.deadline
+        seconds = deadline.remaining() if deadline is not None else None
+        if seconds is not None and math.isinf(seconds):
+            seconds = None
+        search_id = SearchPool.new_search()
+        if stats is not None:
+            state = stats.plain_state(state)
+        futures = [self.pool.submit(search_move, self.spec, state, depth, curr_agent_id, act, seconds, search_id,
+                                    score, stats is not None)
+                   for act in rest]
+        done, not_done = wait(futures, timeout=seconds)
+        if not_done:
+            SearchPool.cancel(search_id)
+            for future in not_done:
+                future.cancel()
+            raise Timeout()
+        for act, future in zip(rest, futures):
+            tmp, nodes, depth_limited, record = future.result()
+            self.alg.nodes += nodes
+            self.alg.depth_limited = self.alg.depth_limited or depth_limited
+            if record is not None:
+                stats.merge(record)
+            if score < tmp:
+                score = tmp
+                action = act
+        self.best_action = action
+        return score, action
+
+
+class ParallelDeepening(IterativeDeepening):
+    # IterativeDeepening whose iterations are root split between the worker processes.
+    def __init__(self, alg: Minimax, time_limit: float, workers: int = config.SEARCH_WORKERS,
+                 time_fraction: float = config.ID_TIME_FRACTION, deadline: Deadline = None):
+        super().__init__(alg, time_limit, True, time_fraction, deadline)
+        self.parallel = ParallelSearch(alg, workers)
+
+    def run_iteration(self, state: GameState, depth: int, curr_agent_id: int) -> (float, str):
+        return self.parallel.search(state, depth, curr_agent_id)
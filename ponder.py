@@ -0,0 +1,132 @@
+import math
+from collections import namedtuple
+from threading import Event, current_thread
+
+from minimax import MinimaxAB, chase_action
+from util import Deadline, Timeout, Worker
+
+# last completed iteration of a ponder search: its depth, (score, action) and whether it searched the whole tree
+Pondered = namedtuple('Pondered', ['depth', 'result', 'complete'])
+
+
+def is_playing(state) -> bool:
+    # the checks game.Game.check_game_status does before every turn, on a private copy of the state
+    state.adjust_win_loss()
+    for agent_id in state.get_stuck_agent_ids():
+        state.set_agent_active(agent_id, False)
+    return not state.is_game_over()
+
+
+def predict_replies(state, agent_id: int, tt=None):
+    # Position expected on the next turn of agent_id: every rival in turn plays the move stored for it in tt,
+    # a rival without one chases agent_id as bots.Aki does. None if the game is expected to end first.
+    state = state.copy()
+    alg = MinimaxAB(tt) if tt is not None else None
+    agents_num = len(state.agents)
+    for rival_id in [(agent_id + step) % agents_num for step in range(1, agents_num)]:
+        if not is_playing(state):
+            return None
+        if not state.agents[rival_id].is_active():
+            continue
+        actions = state.get_legal_actions(rival_id)
+        move = alg.probe_tt(state, 0, -math.inf, math.inf, 0)[1] if alg is not None else None
+        # moves of the multi-agent searches are (agent_id, action) pairs
+        if isinstance(move, tuple):
+            move = move[1] if move[0] == rival_id else None
+        if move not in actions:
+            move = chase_action(state, rival_id, actions, agent_id)
+        state = state.apply_action(rival_id, move)
+    if not is_playing(state) or not state.agents[agent_id].is_active():
+        return None
+    return state
+
+
+class PausableDeadline(Deadline):
+    # Deadline without a time limit whose check() blocks while paused, a paused search waits on the event
+    # without holding the interpreter
+    def __init__(self):
+        super().__init__()
+        self.running = Event()
+        self.running.set()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def cancel(self):
+        super().cancel()
+        self.running.set()
+
+    def check(self):
+        self.counter += 1
+        if self.counter >= Deadline.CHECK_INTERVAL:
+            self.counter = 0
+            self.running.wait()
+            if self.expired():
+                raise Timeout()
+
+
+class Ponderer:
+    # Searches the predicted position on a background thread while the rivals think and move. The search runs
+    # until stop cancels it; if the real position is the predicted one (a ponder hit) its last completed
+    # iteration is handed back, otherwise it is dropped. Both share the agent's tables, so only one of them may
+    # run at a time. The thread shares the interpreter with the rest of the game, so the game pauses it while
+    # a rival searches (the rival would lose part of its think time to it); it gets the time the game spends
+    # on animation and on the rivals that do not search.
+    def __init__(self):
+        self.worker = None
+        self.deadline = None
+        # Zobrist hash of the pondered position
+        self.key = None
+        self.pondered = None
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, search, state, max_levels: int):
+        # search(state, max_levels) runs on the ponder thread, with deadline as its deadline
+        if self.worker is None:
+            self.worker = Worker()
+        self.key = state.zobrist_hash()
+        self.deadline = PausableDeadline()
+        self.pondered = None
+        self.worker.submit(search, state, max_levels)
+
+    def is_pondering(self) -> bool:
+        # True on the ponder thread
+        return self.worker is not None and current_thread() is self.worker
+
+    def pause(self):
+        if self.deadline is not None:
+            self.deadline.pause()
+
+    def resume(self):
+        if self.deadline is not None:
+            self.deadline.resume()
+
+    def stop(self, key: int = None) -> Pondered:
+        # cancels the search and waits for it, returns what it found if key is the pondered position
+        if self.deadline is None:
+            return None
+        self.deadline.cancel()
+        try:
+            self.worker.result()
+        except Exception:
+            # a failed ponder search is only a missed chance
+            self.pondered = None
+        self.deadline = None
+        pondered, self.pondered = self.pondered, None
+        if key is None:
+            return None
+        if key != self.key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pondered
+
+    def close(self):
+        self.stop()
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
@@ -0,0 +1,128 @@
+import os
+import sqlite3
+from collections import namedtuple
+from urllib.parse import quote
+
+import config
+
+from geometry import transform_move
+from transposition import EXACT
+
+DBEntry = namedtuple('DBEntry', ['depth', 'score', 'flag', 'move'])
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS positions (
+    key INTEGER NOT NULL,
+    search TEXT NOT NULL,
+    depth REAL NOT NULL,
+    score REAL NOT NULL,
+    flag INTEGER NOT NULL,
+    move TEXT NOT NULL,
+    PRIMARY KEY (key, search)
+) WITHOUT ROWID'''
+
+
+def canonical_key(state) -> (int, int):
+    # state.canonical_hash of a copy: a state that has its symmetric hashes updates all of them on every move,
+    # the searched state keeps them only if the search asks for them
+    return state.copy().canonical_hash()
+
+
+def signed_key(key: int) -> int:
+    # 64-bit Zobrist hashes as sqlite (signed) integers
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class PositionDB:
+    # Searched root positions kept on disk between games: (canonical Zobrist hash, search) -> depth, score, bound
+    # flag (transposition.EXACT/LOWER/UPPER) and best move, the move of the canonical orientation (mirror images
+    # and rotations of a position share a row). The maps are fixed, so their openings are searched
+    # once and then only looked up. sqlite reads the table pages in on demand; the connection is opened
+    # lazily by every process that probes, so a read-only database is shared by any number of tournament
+    # workers, and writers in several processes are serialized by sqlite (WAL journal).
+    cache = dict()
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.connection = None
+        # process the connection belongs to, a forked process opens its own
+        self.pid = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def get(path: str, read_only: bool = False):
+        db = PositionDB.cache.get((path, read_only))
+        if db is None:
+            db = PositionDB(path, read_only)
+            PositionDB.cache[(path, read_only)] = db
+        return db
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['connection'] = state['pid'] = None
+        return state
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None or self.pid != os.getpid():
+            if self.read_only:
+                if not os.path.exists(self.path):
+                    raise Exception(f'ERR: position database {self.path} does not exist!')
+                self.connection = sqlite3.connect(f'file:{quote(os.path.abspath(self.path))}?mode=ro', uri=True)
+            else:
+                self.connection = sqlite3.connect(self.path, timeout=config.POSITION_DB_TIMEOUT)
+                self.connection.execute('PRAGMA journal_mode=WAL')
+                self.connection.execute('PRAGMA synchronous=NORMAL')
+                self.connection.execute(SCHEMA)
+                self.connection.commit()
+            self.pid = os.getpid()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None and self.pid == os.getpid():
+            self.connection.close()
+        self.connection = None
+        self.pid = None
+
+    def probe(self, key: int, search: str) -> DBEntry:
+        row = self.connect().execute('SELECT depth, score, flag, move FROM positions WHERE key = ? AND search = ?',
+                                     (signed_key(key), search)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return DBEntry(*row)
+
+    def store(self, key: int, search: str, depth: float, score: float, flag: int, move: str):
+        # a deeper entry of the same position is kept
+        if self.read_only:
+            raise Exception(f'ERR: position database {self.path} is read-only!')
+        connection = self.connect()
+        connection.execute('INSERT INTO positions VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key, search) DO UPDATE '
+                           'SET depth = excluded.depth, score = excluded.score, flag = excluded.flag, '
+                           'move = excluded.move WHERE excluded.depth >= positions.depth',
+                           (signed_key(key), search, depth, score, flag, move))
+        connection.commit()
+        self.stores += 1
+
+    def lookup(self, state, agent_id: int, search: str, depth: float) -> DBEntry:
+        # exact result of the position searched at least depth plies deep, None if there is none;
+        # a stored move that is not legal here belongs to a colliding position
+        key, symmetry = canonical_key(state)
+        entry = self.probe(key, search)
+        if entry is None or entry.flag != EXACT or entry.depth < depth:
+            return None
+        entry = entry._replace(move=transform_move(entry.move, state.geometry.symmetries[symmetry].inverse))
+        if entry.move not in state.get_legal_actions(agent_id):
+            return None
+        return entry
+
+    def record(self, state, search: str, depth: float, score: float, move: str):
+        if move is not None:
+            key, symmetry = canonical_key(state)
+            move = transform_move(move, state.geometry.symmetries[symmetry].actions)
+            self.store(key, search, depth, score, EXACT, move)
+
+    def __len__(self):
+        return self.connect().execute('SELECT COUNT(*) FROM positions').fetchone()[0]
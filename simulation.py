@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import random
+import time
+
+# agents are still pygame sprites, keep the pygame banner out of the JSON output
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import config
+
+from bots import BotAgent, Aki
+from states import AgentState, GameState, load_map
+from stats import Profiler
+from students import StudentAgent
+from util import Deadline, Timeout
+
+
+class GameOver(Exception):
+    pass
+
+
+class MatchResult:
+    def __init__(self, map_name, agents, outcome, winner, steps, moves, duration):
+        self.map_name = map_name
+        # class names, in agent id order
+        self.agents = agents
+        # 'win', 'loss' or 'draw' from the StudentAgent (id 0) point of view, as shown by game.Game
+        self.outcome = outcome
+        # id of the winning agent, None if no single agent won
+        self.winner = winner
+        self.steps = steps
+        # one dict per agent turn: agent_id, action, think_time, nodes, depth, status
+        self.moves = moves
+        self.duration = duration
+
+    def think_times(self, agent_id=0):
+        return [move['think_time'] for move in self.moves if move['agent_id'] == agent_id]
+
+    def nodes(self, agent_id=0):
+        return sum(move['nodes'] for move in self.moves if move['agent_id'] == agent_id)
+
+    def to_dict(self):
+        return {
+            'map': self.map_name,
+            'agents': self.agents,
+            'outcome': self.outcome,
+            'winner': self.winner,
+            'steps': self.steps,
+            'moves': self.moves,
+            'duration': self.duration,
+        }
+
+
+class Simulation:
+    # Plays a whole game like game.Game.run, but without a window, sprites or animation.
+    # Agents are called synchronously, a move that takes longer than max_think_time counts as a timeout.
+
+    def __init__(self, map_path, student_class=StudentAgent, bot_classes=None, max_think_time=1, max_levels=-1,
+                 seed=None, verbose=False):
+        self.map_path = map_path
+        self.char_map = load_map(map_path)
+        self.max_think_time = max_think_time
+        self.max_levels = max_levels
+        self.seed = seed
+        self.verbose = verbose
+        self.agents = Simulation.create_agents(self.char_map, student_class, bot_classes)
+        for agent in self.agents:
+            agent.max_think_time = self.max_think_time
+        self.state = GameState(self.char_map, [AgentState.from_agent(agent) for agent in self.agents], None)
+        self.game_steps = 0
+        self.moves = []
+
+    @staticmethod
+    def create_agents(char_map, student_class, bot_classes=None):
+        # same placement rules as game.Game: one StudentAgent with id 0, bots numbered in map order,
+        # bot_classes optionally maps a map character to a bot class
+        bots_module = __import__('bots')
+        BotAgent.ID = 0
+        agents = []
+        for i, row in enumerate(char_map):
+            for j, el in enumerate(row):
+                if el == StudentAgent.kind():
+                    if len(agents) and not agents[0].get_id():
+                        raise Exception(f'ERR: StudentAgent already defined!')
+                    agents.insert(0, student_class((i, j), None))
+                elif el in BotAgent.agent_names.keys():
+                    if bot_classes is not None and el in bot_classes:
+                        class_ = bot_classes[el]
+                    else:
+                        class_ = getattr(bots_module, BotAgent.agent_names[el], Aki)
+                    agents.append(class_((i, j), None))
+        if not len(agents) or agents[0].get_id():
+            raise Exception(f'ERR: StudentAgent NOT defined!')
+        return agents
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def set_active(self, agent_id, active):
+        self.agents[agent_id].set_active(active)
+        self.state.set_agent_active(agent_id, active)
+
+    def check_game_status(self):
+        self.state.adjust_win_loss()
+        for agent_id in self.state.get_stuck_agent_ids():
+            self.set_active(agent_id, False)
+
+        if self.state.is_game_over():
+            if self.state.last_agent_played_id is not None and self.state.is_blocked():
+                self.set_active(self.state.last_agent_played_id, True)
+            raise GameOver()
+
+    def think(self, agent):
+        # the StudentAgent does not ponder while a rival searches, the rival keeps all of its think time
+        searches = agent.get_id() and isinstance(agent, StudentAgent)
+        if searches:
+            self.agents[0].pause_pondering(True)
+        agent.deadline = Deadline(self.max_think_time * config.DEADLINE_FRACTION)
+        start_time = time.perf_counter()
+        try:
+            action = agent.get_next_action(self.state, self.max_levels)
+            status = 'ok'
+        except Timeout:
+            action, status = None, 'timeout'
+        except Exception as e:
+            self.log(f'WARN: Agent {agent.get_id()} failed to choose an action: {e!r}')
+            action, status = None, 'error'
+        elapsed = time.perf_counter() - start_time
+        if searches:
+            self.agents[0].pause_pondering(False)
+        if status == 'ok' and elapsed > self.max_think_time:
+            status = 'timeout'
+        return action, elapsed, status
+
+    def play_turn(self, agent_id, agent):
+        legal_actions = agent.get_legal_actions(self.state)
+        action, elapsed, status = self.think(agent)
+        if status == 'ok' and (not legal_actions or action is None or action not in legal_actions):
+            status = 'illegal'
+        self.moves.append({
+            'agent_id': agent_id,
+            'action': action if status == 'ok' else None,
+            'think_time': elapsed,
+            'nodes': getattr(agent, 'search_nodes', 0),
+            'depth': getattr(agent, 'search_depth', 0),
+            'endgame_length': getattr(agent, 'endgame_length', None),
+            'status': status,
+        })
+        if getattr(agent, 'search_stats', None) is not None and status == 'ok':
+            self.moves[-1]['stats'] = agent.search_stats.to_dict()
+        if status != 'ok':
+            self.log(f'WARN: Agent {agent_id} deactivated ({status})')
+            self.set_active(agent_id, False)
+            return
+        self.log(f'On position {agent.position()} Agent {agent_id} chose action {action} from '
+                 f'legal actions {legal_actions}')
+        self.state = self.state.apply_action(agent_id, action)
+        agent.place_to(self.state.agents[agent_id].position())
+        agent.last_action = action
+        if not agent_id:
+            agent.start_pondering(self.state, self.max_levels)
+
+    def run(self):
+        if self.seed is not None:
+            random.seed(self.seed)
+        start_time = time.perf_counter()
+        try:
+            while True:
+                for agent_id, agent in enumerate(self.agents):
+                    self.check_game_status()
+                    if not agent.is_active():
+                        continue
+                    self.play_turn(agent_id, agent)
+                self.game_steps += 1
+        except GameOver:
+            pass
+        finally:
+            self.agents[0].stop_pondering()
+        return self.result(time.perf_counter() - start_time)
+
+    def result(self, duration):
+        if self.state.is_win():
+            outcome, winner = 'win', 0
+        else:
+            outcome = 'loss' if self.state.is_loss() else 'draw'
+            active = [agent.get_id() for agent in self.agents if agent.is_active()]
+            winner = active[0] if len(active) == 1 else None
+        return MatchResult(os.path.basename(self.map_path), [type(agent).__name__ for agent in self.agents],
+                           outcome, winner, self.game_steps, self.moves, duration)
+
+
+def run_match(map_path, student_class=StudentAgent, bot_classes=None, max_think_time=1, max_levels=-1, seed=None,
+              verbose=False):
+    return Simulation(map_path, student_class, bot_classes, max_think_time, max_levels, seed, verbose).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays games without a window and prints the results as JSON.')
+    parser.add_argument('map', nargs='?', default=os.path.join(config.MAP_FOLDER, 'map0.txt'))
+    parser.add_argument('agent', nargs='?', default=StudentAgent.__name__)
+    parser.add_argument('max_think_time', nargs='?', type=float, default=1)
+    parser.add_argument('max_levels', nargs='?', type=int, default=-1)
+    parser.add_argument('--games', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--output', default=None, help='JSON lines file for the results (default: stdout)')
+    parser.add_argument('--stats', action='store_true', help='add the search statistics to every move')
+    parser.add_argument('--trace', default=None, help='JSON lines file for the search statistics of every move')
+    parser.add_argument('--profile', default=None, choices=Profiler.KINDS, help='profile every search')
+    args = parser.parse_args()
+    student_class = getattr(__import__('students'), args.agent)
+    student_class.collect_stats = args.stats or student_class.collect_stats
+    student_class.stats_trace = args.trace or student_class.stats_trace
+    student_class.profiler = args.profile or student_class.profiler
+    out = open(args.output, 'a') if args.output else None
+    try:
+        for game in range(args.games):
+            seed = None if args.seed is None else args.seed + game
+            result = run_match(args.map, student_class, None, args.max_think_time, args.max_levels, seed,
+                               args.verbose)
+            print(json.dumps(result.to_dict()), file=out, flush=True)
+    finally:
+        if out is not None:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -8,16 +8,20 @@ class BaseSprite(pygame.sprite.Sprite):
 
     def __init__(self, position, file_name, transparent_color=None):
         pygame.sprite.Sprite.__init__(self)
-        if file_name in BaseSprite.images:
-            self.image = BaseSprite.images[file_name]
-        else:
-            self.image = pygame.image.load(os.path.join(config.IMG_FOLDER, file_name)).convert()
-            self.image = pygame.transform.scale(self.image, (config.TILE_SIZE, config.TILE_SIZE))
-            BaseSprite.images[file_name] = self.image
-        # making the image transparent (if needed)
-        if transparent_color:
-            self.image.set_colorkey(transparent_color)
-        self.rect = self.image.get_rect()
+        self.image = None
+        self.rect = None
+        # headless sprites (file_name is None) have no image, they only track their position
+        if file_name is not None:
+            if file_name in BaseSprite.images:
+                self.image = BaseSprite.images[file_name]
+            else:
+                self.image = pygame.image.load(os.path.join(config.IMG_FOLDER, file_name)).convert()
+                self.image = pygame.transform.scale(self.image, (config.TILE_SIZE, config.TILE_SIZE))
+                BaseSprite.images[file_name] = self.image
+            # making the image transparent (if needed)
+            if transparent_color:
+                self.image.set_colorkey(transparent_color)
+            self.rect = self.image.get_rect()
         self.row = None
         self.col = None
         self.place_to(position)
@@ -28,8 +32,9 @@ class BaseSprite(pygame.sprite.Sprite):
     def place_to(self, position):
         self.row = position[0]
         self.col = position[1]
-        self.rect.x = self.col * config.TILE_SIZE
-        self.rect.y = self.row * config.TILE_SIZE
+        if self.rect is not None:
+            self.rect.x = self.col * config.TILE_SIZE
+            self.rect.y = self.row * config.TILE_SIZE
 
     @staticmethod
     def kind():
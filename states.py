@@ -1,18 +1,99 @@
-import copy
-
 from actions import Action
-from tiles import Hole
+from geometry import BoardGeometry
+from zobrist import ZobristKeys
+
+HOLE = 'h'
+ROAD = 'r'
+
+
+def load_map(map_path):
+    # rows of map characters up to the first blank line, shared by game.Game, simulation and benchmark
+    with open(map_path, 'r') as f:
+        matrix = []
+        while True:
+            line = f.readline().strip()
+            if not len(line):
+                break
+            matrix.append([c for c in line])
+    # neighbour tables of the map size, built before the first move is timed
+    BoardGeometry.get(len(matrix), len(matrix[0]))
+    return matrix
+
+
+class AgentState:
+    # Pure-data agent record held by GameState, the pygame sprites stay in game.Game and are synced from it.
+    __slots__ = ('id', 'agent_kind', 'row', 'col', 'active', 'last_action')
+
+    def __init__(self, agent_id, agent_kind, position, active=True, last_action=None):
+        self.id = agent_id
+        self.agent_kind = agent_kind
+        self.row, self.col = position
+        self.active = active
+        self.last_action = last_action
+
+    @staticmethod
+    def from_agent(agent):
+        return AgentState(agent.get_id(), agent.kind(), agent.position(), agent.is_active(), agent.get_last_action())
+
+    def get_id(self):
+        return self.id
+
+    def kind(self):
+        return self.agent_kind
+
+    def position(self):
+        return self.row, self.col
+
+    def place_to(self, position):
+        self.row, self.col = position
+
+    def is_active(self):
+        return self.active
+
+    def set_active(self, active):
+        self.active = active
+
+    def get_last_action(self):
+        return self.last_action
+
+    def copy(self):
+        return AgentState(self.id, self.agent_kind, (self.row, self.col), self.active, self.last_action)
+
+    def apply_action(self, action):
+        self.last_action = action
+        d_row, d_col = Action.actions[action]
+        self.row += d_row
+        self.col += d_col
+
+    def get_legal_actions(self, state):
+        return state.get_legal_actions(self.id)
+
+    @staticmethod
+    def legal_fields():
+        return {ROAD}
 
 
 class GameState:
     initial_state = None
 
-    def __init__(self, char_map, agents, last_agent_played_id):
+    def __init__(self, char_map, agents, last_agent_played_id, geometry=None):
         self.char_map = char_map
+        # neighbour tables of the map size, shared with the copies
+        self.geometry = geometry if geometry is not None else BoardGeometry.get(len(char_map), len(char_map[0]))
         self.agents = agents
         self.last_agent_played_id = last_agent_played_id
         self.win = False
         self.loss = False
+        # (agent_id, old_position, old_last_action, old_last_agent_played_id, old_hash_key, old_symmetric_keys,
+        # old_legal_cache) for every do_action
+        self.undo_stack = []
+        # incremental Zobrist hash, computed lazily by zobrist_hash
+        self.hash_key = None
+        # incremental hashes of the mirrored / rotated states, computed lazily by symmetric_hashes
+        self.symmetric_keys = None
+        # per agent: tuple of the action names legal from its cell, None until get_legal_actions computes it;
+        # kept for inactive agents too, they still block their cell
+        self.legal_cache = [None] * len(agents)
 
     def __str__(self):
         return '\n'.join([''.join(row) for row in self.char_map])
@@ -27,11 +108,85 @@ class GameState:
             self.loss = True if self.last_agent_played_id is not None and self.last_agent_played_id != 0 else False
             self.win = True if self.last_agent_played_id is not None and self.last_agent_played_id == 0 else False
 
+    def get_stuck_agent_ids(self):
+        return [agent.id for agent in self.agents if agent.is_active() and not self.get_legal_actions(agent.id)]
+
+    def is_game_over(self):
+        return self.is_win() or self.is_loss() or all(not agent.is_active() for agent in self.agents)
+
+    def is_blocked(self):
+        return all([not len(self.get_legal_actions(agent_id)) for agent_id in range(len(self.agents))])
+
     def copy(self):
-        char_map_copy = copy.deepcopy(self.char_map)
+        char_map_copy = [row[:] for row in self.char_map]
         agents_copy = [a.copy() for a in self.agents]
         last_agent_played_id = self.last_agent_played_id
-        return GameState(char_map_copy, agents_copy, last_agent_played_id)
+        state = GameState(char_map_copy, agents_copy, last_agent_played_id, self.geometry)
+        state.hash_key = self.hash_key
+        state.symmetric_keys = self.symmetric_keys
+        state.legal_cache = list(self.legal_cache)
+        return state
+
+    def zobrist_keys(self):
+        return ZobristKeys.get(self.geometry.size, len(self.agents))
+
+    def cell_indices(self):
+        # (cell indices of the holes, cell index of every agent)
+        cols = self.geometry.cols
+        positions = [agent.row * cols + agent.col for agent in self.agents]
+        occupied = set(positions)
+        holes = [row_idx * cols + col_idx
+                 for row_idx, row in enumerate(self.char_map) for col_idx, char in enumerate(row)
+                 if char != ROAD and row_idx * cols + col_idx not in occupied]
+        return holes, positions
+
+    def zobrist_hash(self):
+        if self.hash_key is None:
+            holes, positions = self.cell_indices()
+            self.hash_key = self.zobrist_keys().hash(holes, positions, [agent.is_active() for agent in self.agents],
+                                                     self.last_agent_played_id)
+        return self.hash_key
+
+    def symmetric_hashes(self):
+        if self.symmetric_keys is None:
+            holes, positions = self.cell_indices()
+            self.symmetric_keys = self.zobrist_keys().symmetric_hashes(
+                self.geometry.symmetries, holes, positions, [agent.is_active() for agent in self.agents],
+                self.last_agent_played_id)
+        return self.symmetric_keys
+
+    def canonical_hash(self):
+        # (smallest hash of the symmetric states, index of its geometry.symmetries transform), the same key
+        # for every mirror image / rotation of the state
+        keys = self.symmetric_hashes()
+        symmetry = min(range(len(keys)), key=keys.__getitem__)
+        return keys[symmetry], symmetry
+
+    def get_move_hash(self, agent_id, old_agent_pos, new_agent_pos):
+        if self.hash_key is None:
+            return None
+        cols = self.geometry.cols
+        return self.hash_key ^ self.zobrist_keys().move_delta(agent_id, old_agent_pos[0] * cols + old_agent_pos[1],
+                                                              new_agent_pos[0] * cols + new_agent_pos[1],
+                                                              self.last_agent_played_id)
+
+    def get_move_symmetric_hashes(self, agent_id, old_agent_pos, new_agent_pos):
+        if self.symmetric_keys is None:
+            return None
+        cols = self.geometry.cols
+        return self.zobrist_keys().symmetric_move_delta(self.symmetric_keys, self.geometry.symmetries, agent_id,
+                                                        old_agent_pos[0] * cols + old_agent_pos[1],
+                                                        new_agent_pos[0] * cols + new_agent_pos[1],
+                                                        self.last_agent_played_id)
+
+    def set_agent_active(self, agent_id, active):
+        agent = self.agents[agent_id]
+        if agent.is_active() != active and self.hash_key is not None:
+            self.hash_key ^= self.zobrist_keys().inactive[agent_id]
+        if agent.is_active() != active and self.symmetric_keys is not None:
+            inactive = self.zobrist_keys().inactive[agent_id]
+            self.symmetric_keys = tuple(h ^ inactive for h in self.symmetric_keys)
+        agent.set_active(active)
 
     def is_win(self):
         return self.win
@@ -41,35 +196,87 @@ class GameState:
 
     def is_position_legal(self, position, agent):
         row, col = position
-        return 0 <= row < len(self.char_map) and \
-            0 <= col < len(self.char_map[0]) and \
+        return 0 <= row < self.geometry.rows and \
+            0 <= col < self.geometry.cols and \
             self.char_map[row][col] in agent.legal_fields() or position == agent.position()
 
     def get_legal_actions(self, agent_id):
         agent = self.agents[agent_id]
         if not agent.is_active():
             return []
-        agent_pos = agent.position()
-        actions = []
-        for act_name, act_dir in Action.actions.items():
-            new_agent_pos = tuple(map(sum, zip(agent_pos, act_dir)))
-            if self.is_position_legal(new_agent_pos, agent):
-                actions.append(act_name)
-        return actions
+        actions = self.legal_cache[agent_id]
+        if actions is None:
+            row, col = agent.position()
+            char_map = self.char_map
+            legal_fields = agent.legal_fields()
+            # a move never stays in place, so only the in-bounds neighbours of the cell need a look
+            actions = tuple(act_name for act_name, n_row, n_col in self.geometry.steps[row * self.geometry.cols + col]
+                            if char_map[n_row][n_col] in legal_fields)
+            self.legal_cache[agent_id] = actions
+        return list(actions)
 
-    def apply_action(self, agent_id, action):
-        state = self.copy()
+    def invalidate_legal_actions(self, agent_id, new_agent_pos):
+        # after agent_id moved to new_agent_pos: its vacated cell turns from an agent into a hole, both blocked,
+        # so only the mover and the agents next to the entered cell get different legal moves
+        cache = self.legal_cache
+        new_row, new_col = new_agent_pos
+        for agent in self.agents:
+            row, col = agent.position()
+            if agent.id == agent_id or abs(row - new_row) <= 1 and abs(col - new_col) <= 1:
+                cache[agent.id] = None
+
+    def get_new_position(self, agent, action):
         if action not in Action.actions.keys():
             raise Exception(f'ERR: {action} is not a legal action names! '
                             f'Legal names are ({", ".join(n for n in Action.actions.keys())})')
-        agent = state.agents[agent_id]
         old_agent_pos = agent.position()
-        new_agent_pos = tuple(map(sum, zip(old_agent_pos, Action.actions[action])))
-        if not self.is_position_legal(new_agent_pos, agent):
+        new_agent_pos = self.geometry.targets[old_agent_pos[0] * self.geometry.cols + old_agent_pos[1]].get(action)
+        if new_agent_pos is None or self.char_map[new_agent_pos[0]][new_agent_pos[1]] not in agent.legal_fields():
             raise Exception(f'ERR: {action} is not legal! '
                             f'Agent position: {old_agent_pos}')
-        state.char_map[old_agent_pos[0]][old_agent_pos[1]] = Hole.kind()
+        return new_agent_pos
+
+    def apply_action(self, agent_id, action):
+        state = self.copy()
+        agent = state.agents[agent_id]
+        old_agent_pos = agent.position()
+        new_agent_pos = self.get_new_position(agent, action)
+        state.char_map[old_agent_pos[0]][old_agent_pos[1]] = HOLE
         state.char_map[new_agent_pos[0]][new_agent_pos[1]] = agent.kind()
-        agent.apply_action(action)
+        agent.place_to(new_agent_pos)
+        agent.last_action = action
+        state.invalidate_legal_actions(agent_id, new_agent_pos)
+        state.hash_key = self.get_move_hash(agent_id, old_agent_pos, new_agent_pos)
+        state.symmetric_keys = self.get_move_symmetric_hashes(agent_id, old_agent_pos, new_agent_pos)
         state.last_agent_played_id = agent_id
         return state
+
+    # In-place counterpart of apply_action, every do_action must be reverted with undo (LIFO).
+    def do_action(self, agent_id, action):
+        agent = self.agents[agent_id]
+        old_agent_pos = agent.position()
+        new_agent_pos = self.get_new_position(agent, action)
+        self.undo_stack.append((agent_id, old_agent_pos, agent.get_last_action(), self.last_agent_played_id,
+                                self.hash_key, self.symmetric_keys, self.legal_cache))
+        self.char_map[old_agent_pos[0]][old_agent_pos[1]] = HOLE
+        self.char_map[new_agent_pos[0]][new_agent_pos[1]] = agent.kind()
+        agent.place_to(new_agent_pos)
+        agent.last_action = action
+        # the old cache stays on the undo stack untouched, undo puts it back
+        self.legal_cache = list(self.legal_cache)
+        self.invalidate_legal_actions(agent_id, new_agent_pos)
+        self.hash_key = self.get_move_hash(agent_id, old_agent_pos, new_agent_pos)
+        self.symmetric_keys = self.get_move_symmetric_hashes(agent_id, old_agent_pos, new_agent_pos)
+        self.last_agent_played_id = agent_id
+
+    def undo(self):
+        agent_id, old_agent_pos, old_last_action, old_last_agent_played_id, old_hash_key, self.symmetric_keys, \
+            self.legal_cache = self.undo_stack.pop()
+        agent = self.agents[agent_id]
+        new_agent_pos = agent.position()
+        self.char_map[new_agent_pos[0]][new_agent_pos[1]] = ROAD
+        self.char_map[old_agent_pos[0]][old_agent_pos[1]] = agent.kind()
+        agent.place_to(old_agent_pos)
+        agent.last_action = old_last_action
+        self.last_agent_played_id = old_last_agent_played_id
+        self.hash_key = old_hash_key
@@ -0,0 +1,217 @@
+import cProfile
+import json
+import os
+import time
+
+
+class SearchStats:
+    # Collects search statistics of one get_next_action call. Nothing in the search loops refers to it: attach
+    # wraps the tick/cutoff/eval hooks of one algorithm instance and instrument_state switches a state to a
+    # subclass with timed get_legal_actions/apply_action, so searches without a collector run unchanged.
+    # parallel.ParallelSearch collects the statistics of its worker searches too and merges them.
+    TIMERS = ('legal', 'apply', 'eval')
+    # the searches of the nodes and of root moves, every call is one ply further from the root
+    NODE_METHODS = ('run', 'run_in_place', 'search_move')
+    # batch evaluations tick the children of the node they are called on, one ply further
+    CHILD_METHODS = ('leaf_values', 'expand_node')
+
+    def __init__(self):
+        # ply (distance from the root) -> nodes entered (over all iterative deepening iterations)
+        self.nodes_per_ply = dict()
+        # index of the move in the ordered move list -> cutoffs it caused
+        self.cutoffs_by_index = dict()
+        self.evals = 0
+        self.times = {name: 0.0 for name in SearchStats.TIMERS}
+        self.calls = {name: 0 for name in SearchStats.TIMERS}
+        # merged from the worker searches, the tables of the algorithm add their own
+        self.cutoffs = 0
+        self.tt_hits = 0
+        self.tt_probes = 0
+        # calls of NODE_METHODS and CHILD_METHODS in progress, the root node is entered at ply 1
+        self.ply = 0
+        self.timer = None
+        self.alg = None
+        self.tt_start = None
+
+    def attach(self, alg):
+        self.alg = alg
+        alg.stats = self
+        tt = getattr(alg, 'tt', None)
+        if tt is not None:
+            self.tt_start = (tt.hits, tt.hits + tt.misses)
+        stats = self
+        tick, cutoff = alg.tick, alg.cutoff
+
+        def counted_tick(depth):
+            ply = stats.ply - 1
+            stats.nodes_per_ply[ply] = stats.nodes_per_ply.get(ply, 0) + 1
+            tick(depth)
+
+        def counted_cutoff(index):
+            stats.cutoffs_by_index[index] = stats.cutoffs_by_index.get(index, 0) + 1
+            cutoff(index)
+
+        def one_ply_deeper(fn):
+            def deeper(*args):
+                stats.ply += 1
+                try:
+                    return fn(*args)
+                finally:
+                    stats.ply -= 1
+            return deeper
+
+        alg.tick = counted_tick
+        alg.cutoff = counted_cutoff
+        for name in SearchStats.NODE_METHODS + SearchStats.CHILD_METHODS:
+            setattr(alg, name, one_ply_deeper(getattr(alg, name)))
+        # Minimax.eval goes through eval_state, so every leaf is counted once
+        alg.eval_state = self.timed('eval', alg.eval_state, count_evals=True)
+        if hasattr(alg, 'eval_vector'):
+            alg.eval_vector = self.timed('eval', alg.eval_vector, count_evals=True)
+        if hasattr(alg, 'eval_batch'):
+            eval_batch = self.timed('eval', alg.eval_batch)
+
+            def counted_eval_batch(states, agent_id):
+                stats.evals += len(states)
+                return eval_batch(states, agent_id)
+            alg.eval_batch = counted_eval_batch
+        return alg
+
+    def detach(self):
+        # back to the methods of the class, for algorithms kept between searches (parallel worker processes)
+        alg = self.alg
+        for name in ('stats', 'tick', 'cutoff', 'eval_state', 'eval_vector', 'eval_batch') + \
+                SearchStats.NODE_METHODS + SearchStats.CHILD_METHODS:
+            alg.__dict__.pop(name, None)
+
+    def merge(self, record: dict):
+        # adds the counters of a to_dict record of another search, the nodes are already counted by the algorithm
+        for ply, n in record['nodes_per_ply'].items():
+            self.nodes_per_ply[int(ply)] = self.nodes_per_ply.get(int(ply), 0) + n
+        for index, n in record['cutoffs_by_index'].items():
+            self.cutoffs_by_index[int(index)] = self.cutoffs_by_index.get(int(index), 0) + n
+        self.evals += record['evals']
+        self.cutoffs += record['cutoffs']
+        self.tt_hits += record['tt_hits']
+        self.tt_probes += record['tt_probes']
+        for name in SearchStats.TIMERS:
+            self.times[name] += record['times'][name]
+            self.calls[name] += record['calls'][name]
+
+    def timed(self, name, fn, count_evals=False):
+        # time spent in nested timed calls (e.g. legal moves generated by eval) belongs to the outer timer
+        stats = self
+
+        def timed_fn(*args):
+            if count_evals:
+                stats.evals += 1
+            if stats.timer is not None:
+                return fn(*args)
+            stats.timer = name
+            start_time = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                stats.times[name] += time.perf_counter() - start_time
+                stats.calls[name] += 1
+                stats.timer = None
+        return timed_fn
+
+    def instrument_state(self, state):
+        # the copy of the state the search works on, switched to a timed subclass that its successors inherit
+        state = state.copy()
+        state.__class__ = self.timed_class(type(state))
+        return state
+
+    def timed_class(self, state_class):
+        stats = self
+
+        def inherit(fn):
+            def successor(self, *args):
+                state = fn(self, *args)
+                state.__class__ = type(self)
+                return state
+            return successor
+
+        def timed_method(name, fn):
+            timed_fn = stats.timed(name, fn)
+            return lambda self, *args: timed_fn(self, *args)
+
+        attributes = {
+            'get_legal_actions': timed_method('legal', state_class.get_legal_actions),
+            'apply_action': timed_method('apply', inherit(state_class.apply_action)),
+            'do_action': timed_method('apply', state_class.do_action),
+            'undo': timed_method('apply', state_class.undo),
+            'copy': inherit(state_class.copy),
+            'plain_class': state_class,
+        }
+        if hasattr(state_class, '__slots__'):
+            attributes['__slots__'] = ()
+        return type(f'Timed{state_class.__name__}', (state_class,), attributes)
+
+    def plain_state(self, state):
+        # copy of an instrumented state without the timed subclass, which cannot be pickled
+        state = state.copy()
+        state.__class__ = getattr(type(state), 'plain_class', type(state))
+        return state
+
+    def to_dict(self):
+        alg = self.alg
+        tt = getattr(alg, 'tt', None)
+        tt_hits, tt_probes = self.tt_hits, self.tt_probes
+        if tt is not None and self.tt_start is not None:
+            tt_hits += tt.hits - self.tt_start[0]
+            tt_probes += tt.hits + tt.misses - self.tt_start[1]
+        return {
+            'algorithm': type(alg).__name__ if alg is not None else None,
+            'nodes': getattr(alg, 'nodes', 0),
+            'nodes_per_ply': {str(ply): n for ply, n in sorted(self.nodes_per_ply.items())},
+            'evals': self.evals,
+            'cutoffs': getattr(alg, 'cutoffs', 0) + self.cutoffs,
+            'cutoffs_by_index': {str(i): n for i, n in sorted(self.cutoffs_by_index.items())},
+            'tt_hits': tt_hits,
+            'tt_probes': tt_probes,
+            'times': dict(self.times),
+            'calls': dict(self.calls),
+        }
+
+
+class Profiler:
+    # Profiles one get_next_action call with cProfile or pyinstrument, writing one file per call to folder.
+    KINDS = ('cprofile', 'pyinstrument')
+
+    def __init__(self, kind, folder):
+        if kind not in Profiler.KINDS:
+            raise Exception(f'ERR: {kind} is not a profiler! Profilers are ({", ".join(Profiler.KINDS)})')
+        self.kind = kind
+        self.folder = folder
+        self.profiler = None
+
+    def start(self):
+        if self.kind == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            try:
+                from pyinstrument import Profiler as InstrumentProfiler
+            except ImportError:
+                raise Exception(f'ERR: pyinstrument profiler is not installed!')
+            self.profiler = InstrumentProfiler()
+            self.profiler.start()
+
+    def stop(self, name):
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, name)
+        if self.kind == 'cprofile':
+            self.profiler.disable()
+            self.profiler.dump_stats(f'{path}.prof')
+        else:
+            self.profiler.stop()
+            with open(f'{path}.html', 'w') as f:
+                f.write(self.profiler.output_html())
+        self.profiler = None
+
+
+def append_trace(path, record):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
@@ -1,8 +1,23 @@
 import math
+import os
 import random
+import time
+
+import config
 
 from agents import Agent
-from minimax import Minimax, MinimaxAB, Expectimax, MinimaxN
+from bitboard import BitboardState
+from endgame import EndgameSolver, agent_region, is_separated
+from evaluators import EVALUATORS
+from mcts import MCTS
+from minimax import Minimax, MinimaxAB, Expectimax, StarExpectimax, IterativeDeepening, MULTI_AGENT_MODES
+from ordering import MoveOrdering
+from parallel import ParallelSearch, ParallelDeepening, SearchPool
+from ponder import Ponderer, Pondered, predict_replies
+from positiondb import PositionDB
+from stats import SearchStats, Profiler, append_trace
+from transposition import TranspositionTable
+from util import Deadline, Timeout
 
 
 # Example agent, behaves randomly.
@@ -12,6 +27,29 @@ class StudentAgent(Agent):
     def __init__(self, position, file_name):
         super().__init__(position, file_name)
         self.id = 0
+        # set by the game, searches deepen iteratively within this budget when it is known
+        self.max_think_time = None
+        # depth and nodes of the last search, reported by the headless simulation
+        self.search_depth = 0
+        self.search_nodes = 0
+        # length of the walk the endgame solver found on the last move, None if the move was searched
+        self.endgame_length = None
+        # stats.SearchStats of the last search, None unless collect_stats or stats_trace is set
+        self.search_stats = None
+        self.moves_searched = 0
+        # depth the last iterative deepening search that did not reach the end of the game got to
+        self.deepening_depth = 0
+        if self.evaluator not in EVALUATORS:
+            raise Exception(f'ERR: {self.evaluator} is not an evaluator! '
+                            f'Evaluators are ({", ".join(EVALUATORS.keys())})')
+        # kept between moves, the walk found on one move is solved for the next ones too
+        self.endgame = EndgameSolver() if self.solve_endgames else None
+        self.positions = PositionDB.get(self.position_db, self.position_db_read_only) \
+            if self.position_db is not None else None
+        self.ponderer = Ponderer() if self.ponder else None
+        if self.workers > 1:
+            # start the worker processes now instead of during the first move
+            SearchPool.get(self.workers)
 
     @staticmethod
     def kind():
@@ -28,42 +66,312 @@ class StudentAgent(Agent):
         # new_state = state.apply_action(self.id, chosen_action)
         return chosen_action
 
+    # Search agents work on a compact BitboardState copy of the game state (see bitboard.py).
+    use_bitboard = True
+    # Walk one private copy of the state with do_action/undo instead of copying the state per node.
+    in_place = False
+    # Worker processes the root moves are split between (see parallel.py), 1 - search on the calling thread.
+    workers = 1
+    # Search statistics, their JSON lines trace file and the profiler of every search (see stats.py).
+    collect_stats = config.SEARCH_STATS
+    stats_trace = config.STATS_TRACE_FILE
+    profiler = config.PROFILER
+    # Leaf evaluation of the searches, one of evaluators.EVALUATORS.
+    evaluator = config.EVALUATOR
+    # Evaluate the leaves of a node together in one NumPy batch (see evaluators.BoardBatch).
+    batch_eval = config.BATCH_EVAL
+    # Exact longest walk instead of the search once no rival can reach the agent (see endgame.py).
+    solve_endgames = config.ENDGAME_SOLVER
+    # Database of earlier search results probed before searching a position (see positiondb.py), None - off.
+    position_db = config.POSITION_DB
+    position_db_read_only = config.POSITION_DB_READ_ONLY
+    # Search the position expected after the rivals' replies while they think (see ponder.py).
+    ponder = config.PONDER
+
+    def search_state(self, state):
+        return BitboardState.from_game_state(state) if self.use_bitboard else state
+
+    def solve_endgame(self, state):
+        # None unless the agent is separated in a region small enough to solve in time
+        region = agent_region(state, self.get_id())
+        if bin(region).count('1') > config.ENDGAME_MAX_CELLS or not is_separated(state, self.get_id()):
+            return None
+        self.endgame.deadline = Deadline(self.max_think_time * config.ENDGAME_TIME_FRACTION) \
+            if self.max_think_time is not None else None
+        try:
+            return self.endgame.solve(state, self.get_id())
+        except Timeout:
+            return None
+        finally:
+            self.endgame.deadline = None
+            self.search_nodes = self.endgame.nodes
+
+    def position_search(self):
+        # results of different agents and evaluators are kept apart in the position database
+        return f'{type(self).__name__}/{self.evaluator}'
+
+    def position_depth(self, max_levels):
+        # depth of a stored result that can stand in for a search with these limits
+        if max_levels >= 0:
+            return max_levels
+        return max(config.POSITION_DB_MIN_DEPTH, self.deepening_depth) if self.max_think_time is not None else math.inf
+
+    def start_pondering(self, state, max_levels):
+        # called by the game once the move of this agent is played, state - the position after it
+        if self.ponderer is None:
+            return
+        self.ponderer.stop()
+        predicted = predict_replies(state, self.get_id(), getattr(self, 'tt', None))
+        if predicted is not None:
+            self.ponderer.start(self.get_next_action, predicted, max_levels)
+
+    def pause_pondering(self, paused):
+        # called by the game around the turns of rivals that search, they keep all of their think time
+        if self.ponderer is not None:
+            if paused:
+                self.ponderer.pause()
+            else:
+                self.ponderer.resume()
+
+    def stop_pondering(self):
+        # called by the game when it is over
+        if self.ponderer is not None:
+            self.ponderer.close()
+
+    def ponder_search(self, alg, state, max_levels):
+        # search of the ponder thread, deepens until the next turn of the agent cancels it
+        deepening = IterativeDeepening(alg, math.inf, self.in_place, deadline=self.ponderer.deadline)
+        result = deepening.search(state, max_levels, self.get_id())
+        if deepening.depth:
+            self.ponderer.pondered = Pondered(deepening.depth, result, deepening.complete)
+        return result
+
+    def search(self, alg, state, max_levels):
+        state = self.search_state(state)
+        alg.evaluator = EVALUATORS[self.evaluator]
+        alg.batch_eval = self.batch_eval
+        if self.ponderer is not None and self.ponderer.is_pondering():
+            return self.ponder_search(alg, state, max_levels)
+        # the ponder search shares the tables of the agent, it is stopped before anything else
+        pondered = self.ponderer.stop(state.zobrist_hash()) if self.ponderer is not None else None
+        self.endgame_length = None
+        if self.endgame is not None:
+            result = self.solve_endgame(state)
+            if result is not None:
+                # no game tree is searched, the walk length is reported on its own
+                self.search_depth = 0
+                self.endgame_length = result[0]
+                self.search_stats = None
+                return result
+        if self.positions is not None:
+            entry = self.positions.lookup(state, self.get_id(), self.position_search(), self.position_depth(max_levels))
+            if entry is not None:
+                # a solved entry has no depth, it reports the fixed depth or, in unlimited searches, keeps the depth
+                # of the last move searched
+                if entry.depth != math.inf:
+                    self.search_depth = int(entry.depth)
+                elif max_levels >= 0:
+                    self.search_depth = max_levels
+                self.search_nodes = 0
+                self.search_stats = None
+                return entry.score, entry.move
+        position = state
+        stats = None
+        if self.collect_stats or self.stats_trace is not None:
+            stats = SearchStats()
+            stats.attach(alg)
+            state = stats.instrument_state(state)
+        profiler = Profiler(self.profiler, config.PROFILE_FOLDER) if self.profiler is not None else None
+        if profiler is not None:
+            profiler.start()
+        start_time = time.perf_counter()
+        try:
+            if self.max_think_time is not None:
+                if self.workers > 1:
+                    deepening = ParallelDeepening(alg, self.max_think_time, self.workers, deadline=self.deadline)
+                else:
+                    deepening = IterativeDeepening(alg, self.max_think_time, self.in_place, deadline=self.deadline)
+                result = deepening.search(state, max_levels, self.get_id(), pondered)
+                self.search_depth = deepening.depth
+                complete = deepening.complete
+                if not complete:
+                    self.deepening_depth = deepening.depth
+            elif pondered is not None and (pondered.complete or pondered.depth == max_levels):
+                result = pondered.result
+                self.search_depth = max_levels
+                complete = pondered.complete
+            else:
+                alg.start_search()
+                alg.deadline = self.deadline
+                alg.depth_limited = False
+                if self.workers > 1:
+                    result = ParallelSearch(alg, self.workers).search(state, max_levels, self.get_id())
+                elif self.in_place:
+                    result = alg.search_in_place(state, max_levels, self.get_id())
+                else:
+                    result = alg.search(state, max_levels, self.get_id())
+                self.search_depth = max_levels
+                complete = not alg.depth_limited
+        finally:
+            if profiler is not None:
+                profiler.stop(f'{type(self).__name__}_{os.getpid()}_{self.moves_searched}')
+            self.moves_searched += 1
+        self.search_nodes = alg.nodes
+        self.search_stats = stats
+        if self.positions is not None and not self.positions.read_only and self.search_depth:
+            # a search of the whole game tree stands in for a search of any depth
+            depth = math.inf if complete else self.search_depth
+            self.positions.record(position, self.position_search(), depth, result[0], result[1])
+        if stats is not None and self.stats_trace is not None:
+            append_trace(self.stats_trace, {
+                'agent': type(self).__name__,
+                'move': self.moves_searched,
+                'score': result[0],
+                'action': result[1],
+                'depth': self.search_depth,
+                'time': time.perf_counter() - start_time,
+                **stats.to_dict(),
+            })
+        return result
+
 
 class MinimaxAgent(StudentAgent):
 
     def get_next_action(self, state, max_levels):
-        node = Minimax.MaxNode(state)
         alg = Minimax()
 
-        score, node = alg.run(node, max_levels, self.get_id())
-        return node.get_direction()
+        score, action = self.search(alg, state, max_levels)
+        return action
 
 
 class MinimaxABAgent(StudentAgent):
+    # principal variation search and the aspiration window half-width (None - full window)
+    pvs = False
+    aspiration = None
+
+    def __init__(self, position, file_name):
+        super().__init__(position, file_name)
+        # kept between moves, so positions searched on earlier turns give cutoffs and move hints
+        self.tt = TranspositionTable()
+        self.ordering = MoveOrdering()
 
     def get_next_action(self, state, max_levels):
-        node = MinimaxAB.MaxNode(state)
-        alg = MinimaxAB()
+        alg = MinimaxAB(self.tt, self.ordering, self.pvs, self.aspiration)
+
+        score, action = self.search(alg, state, max_levels)
+        return action
+
+
+class MinimaxABVoronoiAgent(MinimaxABAgent):
+    evaluator = 'voronoi'
+
+
+class MinimaxABChamberAgent(MinimaxABAgent):
+    evaluator = 'chamber'
+
 
-        score, node = alg.run(node, max_levels, self.get_id(), -math.inf, math.inf)
-        return node.get_direction()
+class MinimaxPVSAgent(MinimaxABAgent):
+    pvs = True
+    aspiration = config.ASPIRATION_WINDOW
 
 
 class ExpectAgent(StudentAgent):
+    # Star1/Star2 pruned chance nodes (0 - plain Expectimax) and the rival move probabilities
+    star = config.EXPECTIMAX_STAR
+    opponent_model = config.EXPECTIMAX_MODEL
 
     def get_next_action(self, state, max_levels):
-        node = Expectimax.MaxNode(state)
-        alg = Expectimax()
+        alg = StarExpectimax(self.star, self.opponent_model) if self.star else Expectimax()
 
-        score, node = alg.run(node, max_levels, self.get_id())
-        return node.get_direction()
+        score, action = self.search(alg, state, max_levels)
+        return action
+
+
+class ExpectChaseAgent(ExpectAgent):
+    opponent_model = 'chase'
 
 
 class MaxNAgent(StudentAgent):
+    # multi-agent search, one of minimax.MULTI_AGENT_MODES
+    mode = config.MULTI_AGENT_MODE
+
+    def __init__(self, position, file_name):
+        super().__init__(position, file_name)
+        if self.mode not in MULTI_AGENT_MODES:
+            raise Exception(f'ERR: {self.mode} is not a multi-agent mode! '
+                            f'Modes are ({", ".join(MULTI_AGENT_MODES.keys())})')
+        # the alpha-beta based modes keep their tables between moves, as MinimaxABAgent does
+        if issubclass(MULTI_AGENT_MODES[self.mode], MinimaxAB):
+            self.tt = TranspositionTable()
+            self.ordering = MoveOrdering()
+
+    def get_next_action(self, state, max_levels):
+        alg_class = MULTI_AGENT_MODES[self.mode]
+        alg = alg_class(self.tt, self.ordering) if issubclass(alg_class, MinimaxAB) else alg_class()
+
+        score, action = self.search(alg, state, max_levels)
+        return action
+
+
+class ParanoidAgent(MaxNAgent):
+    mode = 'paranoid'
+
+
+class BRSAgent(MaxNAgent):
+    mode = 'brs'
+
+
+class MaxNShallowAgent(MaxNAgent):
+    mode = 'maxn'
+
+
+class MinimaxInPlaceAgent(MinimaxAgent):
+    in_place = True
+
+
+class MinimaxABInPlaceAgent(MinimaxABAgent):
+    in_place = True
+
+
+class MaxNInPlaceAgent(MaxNAgent):
+    in_place = True
+
+
+class MinimaxABParallelAgent(MinimaxABAgent):
+    workers = config.SEARCH_WORKERS
+
+
+class ExpectParallelAgent(ExpectAgent):
+    workers = config.SEARCH_WORKERS
+
+
+class MCTSAgent(StudentAgent):
+    rollout_policy = config.MCTS_ROLLOUT_POLICY
+    exploration = config.MCTS_EXPLORATION
+    # the tree is searched outside of StudentAgent.search, which keeps the ponder thread apart from it
+    ponder = False
+
+    def __init__(self, position, file_name):
+        super().__init__(position, file_name)
+        # kept between moves, the subtree of the reached position is searched further
+        self.mcts = MCTS(self.exploration, self.rollout_policy)
 
     def get_next_action(self, state, max_levels):
-        node = MinimaxN.MaxNode(state)
-        alg = MinimaxN()
+        self.mcts.deadline = self.deadline
+        if self.max_think_time is not None:
+            score, action = self.mcts.search(self.search_state(state), self.get_id(),
+                                             self.max_think_time * config.ID_TIME_FRACTION, None, max_levels)
+        else:
+            score, action = self.mcts.search(self.search_state(state), self.get_id(), None,
+                                             config.MCTS_ITERATIONS, max_levels)
+        self.search_nodes = self.mcts.iterations
+        self.search_depth = self.mcts.root.depth()
+        return action
+
+
+class MCTSChaseAgent(MCTSAgent):
+    rollout_policy = 'chase'
+
 
-        score, node = alg.run(node, max_levels, self.get_id(), self.get_id())
-        return node.get_direction()
+class MCTSMobilityAgent(MCTSAgent):
+    rollout_policy = 'mobility'
@@ -0,0 +1,182 @@
+import argparse
+import csv
+import json
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# agents are still pygame sprites, keep the pygame banner out of the output
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import config
+
+FIELDS = ['agent', 'map', 'seed', 'think_time', 'max_levels', 'outcome', 'winner', 'steps', 'moves',
+          'mean_think_time', 'max_think_time', 'nodes', 'max_depth', 'timeouts', 'illegal', 'errors', 'duration']
+DEFAULT_AGENTS = ['MinimaxAgent', 'MinimaxABAgent', 'ExpectAgent', 'MaxNAgent']
+
+
+def match_key(agent, map_name, seed, think_time, max_levels):
+    return agent, map_name, int(seed), float(think_time), int(max_levels)
+
+
+def play(agent, map_path, seed, think_time, max_levels):
+    # runs in a pool worker, returns one flat result row
+    from simulation import run_match
+    student_class = getattr(__import__('students'), agent)
+    result = run_match(map_path, student_class, None, think_time, max_levels, seed)
+    own_moves = [move for move in result.moves if move['agent_id'] == 0]
+    think_times = [move['think_time'] for move in own_moves]
+    return {
+        'agent': agent,
+        'map': os.path.basename(map_path),
+        'seed': seed,
+        'think_time': think_time,
+        'max_levels': max_levels,
+        'outcome': result.outcome,
+        'winner': result.winner,
+        'steps': result.steps,
+        'moves': len(own_moves),
+        'mean_think_time': statistics.mean(think_times) if think_times else 0.0,
+        'max_think_time': max(think_times) if think_times else 0.0,
+        'nodes': sum(move['nodes'] for move in own_moves),
+        'max_depth': max((move['depth'] for move in own_moves), default=0),
+        'timeouts': sum(move['status'] == 'timeout' for move in own_moves),
+        'illegal': sum(move['status'] == 'illegal' for move in own_moves),
+        'errors': sum(move['status'] == 'error' for move in own_moves),
+        'duration': result.duration,
+    }
+
+
+class ResultsFile:
+    # Append-only results, JSON lines or CSV depending on the file extension, so that an interrupted
+    # tournament can be resumed from what already finished.
+    def __init__(self, path):
+        self.path = path
+        self.is_csv = path.lower().endswith('.csv')
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', newline='') as f:
+            if self.is_csv:
+                return [ResultsFile.parse_csv_row(row) for row in csv.DictReader(f)]
+            return [json.loads(line) for line in f if line.strip()]
+
+    @staticmethod
+    def parse_csv_row(row):
+        for field in ('seed', 'max_levels', 'steps', 'moves', 'nodes', 'max_depth', 'timeouts', 'illegal', 'errors'):
+            row[field] = int(row[field])
+        for field in ('think_time', 'mean_think_time', 'max_think_time', 'duration'):
+            row[field] = float(row[field])
+        row['winner'] = int(row['winner']) if row['winner'] not in ('', 'None') else None
+        return row
+
+    def append(self, row):
+        new_file = not os.path.exists(self.path) or not os.path.getsize(self.path)
+        if new_file:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', newline='') as f:
+            if self.is_csv:
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row) + '\n')
+
+
+class Tournament:
+    # Plays every agent x map x seed x think time combination on a process pool and streams each result
+    # to the results file as soon as its game ends. Games already in the file are skipped.
+    def __init__(self, agents, maps, seeds, think_times, max_levels=-1,
+                 output=os.path.join(config.RESULTS_FOLDER, 'tournament.jsonl'), workers=None):
+        self.agents = agents
+        self.maps = maps
+        self.seeds = seeds
+        self.think_times = think_times
+        self.max_levels = max_levels
+        self.results = ResultsFile(output)
+        self.workers = workers or os.cpu_count()
+
+    def matches(self):
+        return [(agent, map_path, seed, think_time, self.max_levels)
+                for agent in self.agents for map_path in self.maps
+                for think_time in self.think_times for seed in self.seeds]
+
+    def pending_matches(self):
+        done = {match_key(row['agent'], row['map'], row['seed'], row['think_time'], row['max_levels'])
+                for row in self.results.read()}
+        return [match for match in self.matches()
+                if match_key(match[0], os.path.basename(match[1]), *match[2:]) not in done]
+
+    def run(self, verbose=True):
+        pending = self.pending_matches()
+        if verbose:
+            print(f'{len(self.matches()) - len(pending)} games already played, {len(pending)} to go '
+                  f'on {self.workers} workers')
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(play, *match): match for match in pending}
+            for i, future in enumerate(as_completed(futures), 1):
+                match = futures[future]
+                try:
+                    row = future.result()
+                except Exception as e:
+                    print(f'ERR: {match} failed: {e!r}')
+                    continue
+                self.results.append(row)
+                if verbose:
+                    print(f'[{i}/{len(pending)}] {row["agent"]} on {row["map"]} (seed {row["seed"]}, '
+                          f'{row["think_time"]}s): {row["outcome"]} in {row["steps"]} steps')
+        return self.results.read()
+
+
+def aggregate(rows):
+    # (agent, map) -> games, win rate, mean think time per move, timeouts
+    groups = dict()
+    for row in rows:
+        groups.setdefault((row['agent'], row['map']), []).append(row)
+    table = []
+    for (agent, map_name), group in sorted(groups.items()):
+        moves = sum(row['moves'] for row in group)
+        table.append({
+            'agent': agent,
+            'map': map_name,
+            'games': len(group),
+            'win_rate': sum(row['outcome'] == 'win' for row in group) / len(group),
+            'mean_think_time': sum(row['mean_think_time'] * row['moves'] for row in group) / moves if moves else 0.0,
+            'mean_nodes': sum(row['nodes'] for row in group) / moves if moves else 0.0,
+            'timeouts': sum(row['timeouts'] for row in group),
+        })
+    return table
+
+
+def format_table(table):
+    lines = [f'{"agent":<24}{"map":<12}{"games":>7}{"win rate":>10}{"think [s]":>11}{"nodes/move":>12}{"timeouts":>10}']
+    for row in table:
+        lines.append(f'{row["agent"]:<24}{row["map"]:<12}{row["games"]:>7}{row["win_rate"]:>10.2%}'
+                     f'{row["mean_think_time"]:>11.3f}{row["mean_nodes"]:>12.0f}{row["timeouts"]:>10}')
+    return '\n'.join(lines)
+
+
+def main():
+    maps = sorted(os.path.join(config.MAP_FOLDER, name) for name in os.listdir(config.MAP_FOLDER)
+                  if name.endswith('.txt'))
+    parser = argparse.ArgumentParser(description='Plays agent x map x seed x think time tournaments headless.')
+    parser.add_argument('--agents', nargs='+', default=DEFAULT_AGENTS)
+    parser.add_argument('--maps', nargs='+', default=maps)
+    parser.add_argument('--seeds', type=int, default=1, help='number of seeds per combination')
+    parser.add_argument('--think-times', nargs='+', type=float, default=[1])
+    parser.add_argument('--max-levels', type=int, default=-1)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=os.path.join(config.RESULTS_FOLDER, 'tournament.jsonl'),
+                        help='.jsonl or .csv results file')
+    parser.add_argument('--summary', action='store_true', help='only print the tables of the results file')
+    args = parser.parse_args()
+    tournament = Tournament(args.agents, args.maps, list(range(args.seeds)), args.think_times, args.max_levels,
+                            args.output, args.workers)
+    rows = tournament.results.read() if args.summary else tournament.run()
+    print(format_table(aggregate(rows)))
+
+
+if __name__ == '__main__':
+    main()
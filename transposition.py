@@ -0,0 +1,111 @@
+from collections import namedtuple
+
+import config
+
+# bound types of a stored score
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+TTEntry = namedtuple('TTEntry', ['key', 'depth', 'score', 'flag', 'move', 'generation'])
+
+
+class TranspositionTable:
+    # Replacement policies:
+    # DEPTH_PREFERRED - keep the deeper entry, entries from older searches are always replaced
+    # ALWAYS_REPLACE - the newest entry wins
+    # TWO_TIER - every bucket has a depth-preferred and an always-replace slot
+    DEPTH_PREFERRED = 'depth'
+    ALWAYS_REPLACE = 'always'
+    TWO_TIER = 'two_tier'
+
+    def __init__(self, max_entries=config.TT_MAX_ENTRIES, replacement=config.TT_REPLACEMENT,
+                 symmetric=config.TT_SYMMETRY):
+        if replacement not in (TranspositionTable.DEPTH_PREFERRED, TranspositionTable.ALWAYS_REPLACE,
+                               TranspositionTable.TWO_TIER):
+            raise Exception(f'ERR: {replacement} is not a known replacement policy!')
+        self.max_entries = max(2, max_entries)
+        self.replacement = replacement
+        # positions are keyed by their canonical hash (state.canonical_hash), mirror images and rotations share
+        # an entry whose move is stored for the canonical orientation
+        self.symmetric = symmetric
+        self.slots_per_bucket = 2 if replacement == TranspositionTable.TWO_TIER else 1
+        self.buckets = self.max_entries // self.slots_per_bucket
+        self.table = [None] * (self.buckets * self.slots_per_bucket)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def __len__(self):
+        return sum(1 for entry in self.table if entry is not None)
+
+    def new_search(self):
+        # entries from previous searches lose their depth priority
+        self.generation += 1
+
+    def clear(self):
+        self.table = [None] * len(self.table)
+        self.generation = 0
+        self.hits = self.misses = self.collisions = self.stores = self.overwrites = 0
+
+    def probe(self, key):
+        start = (key % self.buckets) * self.slots_per_bucket
+        occupied = False
+        for entry in self.table[start:start + self.slots_per_bucket]:
+            if entry is None:
+                continue
+            if entry.key == key:
+                self.hits += 1
+                return entry
+            occupied = True
+        self.misses += 1
+        if occupied:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        start = (key % self.buckets) * self.slots_per_bucket
+        new_entry = TTEntry(key, depth, score, flag, move, self.generation)
+        table = self.table
+        self.stores += 1
+        if self.replacement == TranspositionTable.ALWAYS_REPLACE:
+            self.set_slot(start, new_entry)
+        elif self.replacement == TranspositionTable.DEPTH_PREFERRED:
+            if self.is_replaceable(table[start], new_entry):
+                self.set_slot(start, new_entry)
+        else:
+            deep, recent = table[start], table[start + 1]
+            if recent is not None and recent.key == key and (deep is None or deep.key != key):
+                # keep a single copy of the position per bucket
+                table[start + 1] = None
+            if self.is_replaceable(deep, new_entry):
+                if deep is not None and deep.key != key:
+                    # the evicted deep entry moves to the always-replace slot
+                    self.set_slot(start + 1, deep)
+                table[start] = new_entry
+            else:
+                self.set_slot(start + 1, new_entry)
+
+    def set_slot(self, idx, entry):
+        if self.table[idx] is not None and self.table[idx].key != entry.key:
+            self.overwrites += 1
+        self.table[idx] = entry
+
+    def is_replaceable(self, old, new):
+        return old is None or old.key == new.key or old.generation != new.generation or new.depth >= old.depth
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'max_entries': len(self.table),
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+            'hit_rate': self.hits / probes if probes else 0.0,
+        }
@@ -1,45 +1,86 @@
-import ctypes
 import time
-from threading import Timer, Thread
+from queue import Queue, Empty
+from threading import Thread
+
+
+def manhattan(pos1, pos2):
+    return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
 
 
 class Timeout(Exception):
     pass
 
 
-def send_thread_exception(*args):
-    for t_id in args:
-        res = ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(t_id), ctypes.py_object(Timeout))
-        if not res:
-            print(f'ERR: Thread {t_id} not found')
-        if res > 1:
-            ctypes.pythonapi.PyThreadState_SetAsyncExc(t_id, 0)
-            print(f'ERR: Failed to send exception to thread {t_id}')
+class WaitTimeout(Exception):
+    # Worker.result waited in vain, unlike Timeout raised by the call itself
+    pass
 
 
-class TimedFunction(Thread):
-    def __init__(self, parent_id, queue, max_time_sec, method, *args):
-        super().__init__()
-        self.parent_id = parent_id
-        self.queue = queue
-        self.max_time_sec = max_time_sec
-        self.method = method
-        self.args = args
+class Deadline:
+    # Cooperative cancellation token. Searches call check() on every node, the clock is only read
+    # every CHECK_INTERVAL calls and Timeout is raised once the deadline passed or cancel() was called.
+    CHECK_INTERVAL = 64
 
-    def get_id(self):
-        return self.ident
+    def __init__(self, seconds=None):
+        self.end_time = None if seconds is None else time.perf_counter() + seconds
+        self.cancelled = False
+        self.counter = 0
 
-    def run(self) -> None:
-        timer = Timer(interval=self.max_time_sec,
-                      function=send_thread_exception, args=[self.ident, self.parent_id])
-        timer.start()
+    def cancel(self):
+        self.cancelled = True
+
+    def remaining(self):
+        if self.cancelled:
+            return 0
+        if self.end_time is None:
+            return float('inf')
+        return max(0, self.end_time - time.perf_counter())
+
+    def expired(self):
+        return self.cancelled or self.end_time is not None and time.perf_counter() >= self.end_time
+
+    def check(self):
+        self.counter += 1
+        if self.counter >= Deadline.CHECK_INTERVAL:
+            self.counter = 0
+            if self.expired():
+                raise Timeout()
+
+
+class Worker(Thread):
+    # Long-lived daemon thread that runs submitted calls one at a time, so a move does not pay for
+    # a new thread. Results come back through a queue the caller blocks on.
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.tasks = Queue()
+        self.results = Queue()
+        self.start()
+
+    def submit(self, method, *args):
+        self.tasks.put((method, args))
+
+    def result(self, timeout=None):
+        # returns (result, elapsed_time), re-raises the exception of the call or raises WaitTimeout
+        # if nothing arrived in timeout seconds
         try:
+            result, elapsed_time, exception = self.results.get(timeout=timeout)
+        except Empty:
+            raise WaitTimeout()
+        if exception is not None:
+            raise exception
+        return result, elapsed_time
+
+    def stop(self):
+        self.tasks.put((None, ()))
+
+    def run(self) -> None:
+        while True:
+            method, args = self.tasks.get()
+            if method is None:
+                break
             start_time = time.time()
-            result = self.method(*self.args)
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            self.queue.put((result, elapsed_time), block=False)
-        except (Timeout, Exception):
-            pass
-        finally:
-            timer.cancel()
+            try:
+                result = method(*args)
+                self.results.put((result, time.time() - start_time, None))
+            except Exception as e:
+                self.results.put((None, time.time() - start_time, e))
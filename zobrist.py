@@ -0,0 +1,51 @@
+import random
+
+
+class ZobristKeys:
+    # Random 64-bit keys per board cell count and agent count, seeded so hashes are stable between runs.
+    SEED = 0x5EED
+    cache = dict()
+
+    def __init__(self, cells, agents_num):
+        rnd = random.Random(f'{ZobristKeys.SEED}-{cells}-{agents_num}')
+        self.holes = [rnd.getrandbits(64) for _ in range(cells)]
+        self.positions = [[rnd.getrandbits(64) for _ in range(cells)] for _ in range(agents_num)]
+        self.inactive = [rnd.getrandbits(64) for _ in range(agents_num)]
+        # side to move is derived from the agent that played last
+        self.last_played = [rnd.getrandbits(64) for _ in range(agents_num)]
+
+    @staticmethod
+    def get(cells, agents_num):
+        keys = ZobristKeys.cache.get((cells, agents_num))
+        if keys is None:
+            keys = ZobristKeys(cells, agents_num)
+            ZobristKeys.cache[(cells, agents_num)] = keys
+        return keys
+
+    def hash(self, holes, positions, active, last_agent_played_id):
+        h = 0
+        for idx in holes:
+            h ^= self.holes[idx]
+        for agent_id, idx in enumerate(positions):
+            h ^= self.positions[agent_id][idx]
+            if not active[agent_id]:
+                h ^= self.inactive[agent_id]
+        if last_agent_played_id is not None:
+            h ^= self.last_played[last_agent_played_id]
+        return h
+
+    def symmetric_hashes(self, symmetries, holes, positions, active, last_agent_played_id):
+        # hashes of the state mapped by every geometry.BoardGeometry symmetry, the first one is the plain hash
+        return tuple(self.hash([cells[idx] for idx in holes], [cells[idx] for idx in positions], active,
+                               last_agent_played_id) for cells, _, _ in symmetries)
+
+    def symmetric_move_delta(self, hashes, symmetries, agent_id, old_idx, new_idx, old_last_agent_played_id):
+        return tuple(h ^ self.move_delta(agent_id, cells[old_idx], cells[new_idx], old_last_agent_played_id)
+                     for h, (cells, _, _) in zip(hashes, symmetries))
+
+    def move_delta(self, agent_id, old_idx, new_idx, old_last_agent_played_id):
+        # the vacated cell becomes a hole and agent_id becomes the last agent that played
+        delta = self.positions[agent_id][old_idx] ^ self.positions[agent_id][new_idx] ^ self.holes[old_idx]
+        if old_last_agent_played_id is not None:
+            delta ^= self.last_played[old_last_agent_played_id]
+        return delta ^ self.last_played[agent_id]